@@ -16,7 +16,8 @@ import scipy.signal
 import wave
 import arguments as arg
 import tflite_runtime.interpreter as tflite
-from sklearn import preprocessing
+import feature.scale as scale
+import buffer.buffer as rb
 
 __sample__ = False
 __samele_amount__ = 100
@@ -29,11 +30,9 @@ class DataProcess(Process):
         self.mpu = mpuD.MPU9250()
         self.queue = queue
 
-        self.mic_todo = [1 for i in range(15000)]
+        self.mic_todo = rb.RingBuffer(15000, fill=1)
 
-        self.acc_x_todo = [1 for i in range(2000)]
-        self.acc_y_todo = [1 for i in range(2000)]
-        self.acc_z_todo = [1 for i in range(2000)]
+        self.acc_todo = rb.RingBuffer(2000, channels=3, fill=1)
 
         self.gyr_x_todo = [1 for i in range(2000)]
         self.gyr_y_todo = [1 for i in range(2000)]
@@ -67,8 +66,7 @@ class DataProcess(Process):
                 start = time.time()
                 stream_data = stream.read(chunk, exception_on_overflow=False)
                 audio_data = np.frombuffer(stream_data, dtype=np.int16)
-                del self.mic_todo[:chunk]
-                self.mic_todo.extend(audio_data)
+                self.mic_todo.write(audio_data)
                 # print("MIC:", time.time() - start)
         else:
             amount = 1
@@ -106,12 +104,7 @@ class DataProcess(Process):
             while True:
                 start = time.time()
                 acc = self.mpu.readAccel()
-                del self.acc_x_todo[0]
-                del self.acc_y_todo[0]
-                del self.acc_z_todo[0]
-                self.acc_x_todo.append(acc['x'])
-                self.acc_y_todo.append(acc['y'])
-                self.acc_z_todo.append(acc['z'])
+                self.acc_todo.append((acc['x'], acc['y'], acc['z']))
                 times = times + time.time() - start
                 if amount % 20 == 0:
                     #print(times/20)
@@ -273,11 +266,12 @@ class DataProcess(Process):
         while True:
             if not self.queue.full():
                 start = time.time()
-                data = {'mic': self.mic_todo,
+                acc = self.acc_todo.copy()
+                data = {'mic': self.mic_todo.copy(),
                         'laser': self.laser_todo,
-                        'acc_x': self.acc_x_todo,
-                        'acc_y': self.acc_y_todo,
-                        'acc_z': self.acc_z_todo}
+                        'acc_x': acc[0],
+                        'acc_y': acc[1],
+                        'acc_z': acc[2]}
                 self.queue.put(data)
                 time.sleep(0.2)
                 # 0.002
@@ -311,27 +305,25 @@ class FeatureProcess(Process):
         self.laser_feature = np.random.random((128, 1))
 
     def stft_mic(self):
-        scaler = preprocessing.StandardScaler()
         while True:
             start = time.time()
             _, _, ps = scipy.signal.stft(self.mic_todo, fs=15000, nperseg=256, noverlap=32)
-            self.mic_feature = scaler.fit_transform(abs(ps[1:]))
+            self.mic_feature = scale.standardize(abs(ps[1:]))
             self.laser_feature = [self.laser_todo for i in range(128)]
             time.sleep(0.2)
             # print("mic_stft:", self.mic_feature, time.time() - start)
 
 
     def stft_acc(self):
-        scaler = preprocessing.StandardScaler()
         while True:
             start = time.time()
             # scipy.signal.stft(acc_x_todo, fs=2000, nperseg=256, noverlap=32, boundary=None, padded=None)
             _, _, ps = scipy.signal.stft(self.acc_x_todo, fs=2000, nperseg=256, noverlap=160)
-            self.acc_x_feature = scaler.fit_transform(abs(ps[1:]))
+            self.acc_x_feature = scale.standardize(abs(ps[1:]))
             _, _, ps = scipy.signal.stft(self.acc_y_todo, fs=2000, nperseg=256, noverlap=160)
-            self.acc_y_feature = scaler.fit_transform(abs(ps[1:]))
+            self.acc_y_feature = scale.standardize(abs(ps[1:]))
             _, _, ps = scipy.signal.stft(self.acc_z_todo, fs=2000, nperseg=256, noverlap=160)
-            self.acc_z_feature = scaler.fit_transform(abs(ps[1:]))
+            self.acc_z_feature = scale.standardize(abs(ps[1:]))
             time.sleep(0.2)
             #print("acc_stft:", self.acc_x_feature.shape, time.time()-start)
 
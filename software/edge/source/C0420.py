@@ -17,7 +17,8 @@ import requests
 import wave
 import arguments as arg
 import tflite_runtime.interpreter as tflite
-from sklearn import preprocessing
+import feature.scale as scale
+import buffer.buffer as rb
 
 _sample = False
 _amount = 50
@@ -32,10 +33,8 @@ class DataProcess(Process):
         self.queue_acc = queue_acc
 
         # raw data placeholder
-        self.mic_todo = [1 for i in range(7500)]
-        self.acc_x_todo = [1 for i in range(500)]
-        self.acc_y_todo = [1 for i in range(500)]
-        self.acc_z_todo = [1 for i in range(500)]
+        self.mic_todo = rb.RingBuffer(7500, fill=1)
+        self.acc_todo = rb.RingBuffer(500, channels=3, fill=1)
         self.laser_todo = 0
 
     def mic_raw(self):
@@ -56,7 +55,7 @@ class DataProcess(Process):
                 start = time.time()
                 stream_data = stream.read(chunk, exception_on_overflow=False)
                 audio_data = np.frombuffer(stream_data, dtype=np.int16)
-                self.mic_todo = audio_data
+                self.mic_todo.write(audio_data)
                 # print('mic:', time.time()-start)
 
         if _sample:
@@ -90,12 +89,7 @@ class DataProcess(Process):
             while True:
                 start = time.time()
                 acc = self.mpu.readAccel()
-                del self.acc_x_todo[0]
-                del self.acc_y_todo[0]
-                del self.acc_z_todo[0]
-                self.acc_x_todo.append(acc['x'])
-                self.acc_y_todo.append(acc['y'])
-                self.acc_z_todo.append(acc['z'])
+                self.acc_todo.append((acc['x'], acc['y'], acc['z']))
                 time.sleep(0.0006)
                 # print('acc: ', time.time()-start)
 
@@ -162,13 +156,14 @@ class DataProcess(Process):
         while True:
             if not self.queue_mic.full():
                 start = time.time()
-                data = {'mic': self.mic_todo}
+                data = {'mic': self.mic_todo.copy()}
                 self.queue_mic.put(data)
             if not self.queue_acc.full():
                 start = time.time()
-                data = {'acc_x': self.acc_x_todo,
-                        'acc_y': self.acc_y_todo,
-                        'acc_z': self.acc_z_todo,
+                acc = self.acc_todo.copy()
+                data = {'acc_x': acc[0],
+                        'acc_y': acc[1],
+                        'acc_z': acc[2],
                         'laser': self.laser_todo}
                 self.queue_acc.put(data)
             time.sleep(0.5)
@@ -181,13 +176,12 @@ class MicFeatureProcess(Process):
         self.queue_out = queue_out
 
     def run(self):
-        scaler = preprocessing.StandardScaler()
         while True:
             if not self.queue_in.empty():
                 start = time.time()
                 result = self.queue_in.get()
                 _, _, ps = scipy.signal.stft(result['mic'], fs=15000, nperseg=256, noverlap=32)
-                mic_feature = scaler.fit_transform(abs(ps[1:]))
+                mic_feature = scale.standardize(abs(ps[1:]))
                 self.queue_out.put(mic_feature)
                 # print("mic_stft:", result['mic'][:10], time.time() - start)
 
@@ -199,17 +193,16 @@ class AccFeatureProcess(Process):
         self.queue_out = queue_out
 
     def run(self):
-        scaler = preprocessing.StandardScaler()
         while True:
             if not self.queue_in.empty():
                 start = time.time()
                 result = self.queue_in.get()
                 _, _, ps = scipy.signal.stft(result['acc_x'], fs=1000, nperseg=256, noverlap=160)
-                acc_x_feature = scaler.fit_transform(abs(ps[1:]))
+                acc_x_feature = scale.standardize(abs(ps[1:]))
                 _, _, ps = scipy.signal.stft(result['acc_y'], fs=1000, nperseg=256, noverlap=160)
-                acc_y_feature = scaler.fit_transform(abs(ps[1:]))
+                acc_y_feature = scale.standardize(abs(ps[1:]))
                 _, _, ps = scipy.signal.stft(result['acc_z'], fs=1000, nperseg=256, noverlap=160)
-                acc_z_feature = scaler.fit_transform(abs(ps[1:]))
+                acc_z_feature = scale.standardize(abs(ps[1:]))
                 laser_feature = [result['laser'] for i in range(128)]
                 data = {'acc_x': acc_x_feature,
                         'acc_y': acc_y_feature,
@@ -233,57 +226,29 @@ class RecoModelProcess(Process):
         self.laser_feature = np.random.random((128, 1))
 
     def visulation(self, results):
-        # 128 * 35 => 128 * 30
-        mic_data = self.mic_feature[:, 5:]
-
-        # 128 * 7  => 128 * 6
-        acc_x_data = self.acc_x_feature[:, 1:]
-        acc_y_data = self.acc_y_feature[:, 1:]
-        acc_z_data = self.acc_z_feature[:, 1:]
+        # 128 * 35 => 128 * 30 => 64 * 30, mean of two rows
+        mic_data = self.mic_feature[:, 5:].reshape(64, 2, 30).mean(axis=1)
+
+        # 64 * 30 => 6 * 64, row k is the mean of the columns 5k..5k+9, cut at column 30
+        mic_sum = np.zeros((64, 31))
+        np.cumsum(mic_data, axis=1, out=mic_sum[:, 1:])
+        starts = np.arange(0, 30, 5)
+        ends = np.minimum(starts + 10, 30)
+        m = np.transpose((mic_sum[:, ends] - mic_sum[:, starts]) / (ends - starts))
+
+        # 128 * 7 => 128 * 6 => 64 * 6 => 6 * 64, the three axes at once
+        acc = np.stack((self.acc_x_feature, self.acc_y_feature, self.acc_z_feature))[:, :, 1:]
+        acc = acc.reshape(3, 64, 2, 6).mean(axis=2).transpose(0, 2, 1)
+        # row i is the mean of the rows 0..i+1, cut at row 6
+        rows = np.minimum(np.arange(6) + 2, 6)
+        acc = np.cumsum(acc, axis=1)[:, rows - 1] / rows.reshape(1, 6, 1)
         laser_data = self.laser_feature[0]
 
-        # 128 * 30 => 64 * 30
-        mic_data_tmp = []
-        for i in range(0, 128, 2):
-            mic_data_tmp.append(np.mean(mic_data[i:i+2], 0))
-
-        # 64 * 30 => 6 * 64
-        m = []
-        mic_data = np.array(mic_data_tmp)
-        for i in range(0, 30, 5):
-            m.append(np.mean(mic_data[:, i:i+10], 1))
-
-        # 128 * 6 => 64 * 6
-        x = []
-        y = []
-        z = []
-        for i in range(0, 128, 2):
-            x.append(np.mean(acc_x_data[i:i+2], 0))
-            y.append(np.mean(acc_y_data[i:i+2], 0))
-            z.append(np.mean(acc_z_data[i:i+2], 0))
-
-        x_tmp = []
-        y_tmp = []
-        z_tmp = []
-        acc_x_data = np.transpose(np.array(x))
-        acc_y_data = np.transpose(np.array(y))
-        acc_z_data = np.transpose(np.array(z))
-        for i in range(6):
-            x_tmp.append(np.mean(acc_x_data[0:i+2], 0))
-            y_tmp.append(np.mean(acc_y_data[0:i+2], 0))
-            z_tmp.append(np.mean(acc_z_data[0:i+2], 0))
-        x = x_tmp
-        y = y_tmp
-        z = z_tmp
-
         # 1 * 1 => 6 * 64
-        l = np.array([laser_data for i in range(64 * 6)]).reshape(6, 64)
+        l = np.full((6, 64), laser_data)
 
-        # 64 * 6 => 6 * 64
-        m = np.array(m) + 1
-        x = np.array(x)
-        y = np.array(y)
-        z = np.array(z)
+        m = m + 1
+        x, y, z = acc
 
         m = m.reshape(-1).tolist()
         x = x.reshape(-1).tolist()
@@ -6,7 +6,80 @@ duration = 50      # duration
 
 
 chunk = 7500
+# mpu FIFO sample rate(Hz) and the interval(s) between two FIFO reads
+acc_rate = 1000
+fifo_interval = 0.02
+# interval(s) between two windows published to the feature processes
+publish_interval = 0.5
+# compute only the stft frames of new samples, then publish_interval can be as short as one hop.
+# the streaming frames are aligned to the start of the stream, the models are trained on frames aligned
+# to the window (server/source/feature.py), so it stays off until they are trained on streaming frames
+stream_stft = False
+# seconds a stage waits for input before it checks the stop event, seconds between two stage reports
+stage_timeout = 0.5
+stats_period = 10
+# amount of windows kept between two stages, older windows are dropped
+mailbox_depth = 1
+# tflite interpreters: threads of one invoke, default XNNPACK delegate, optional external delegate library,
+# amount of models invoked in parallel worker threads
+num_threads = 2
+xnnpack = True
+delegate_path = None
+model_workers = 1
+# windows per invoke of the model, name of the prediction in the model signature
+model_batch = 1
+final_output = 'output_1'
+# use the int8 model exported by server/source/tflite.py, the features are quantized into its input
+int8 = False
+# model registry: directory of the models of every scene, amount of scenes kept loaded,
+# seconds between two checks of the model files for a new version
+model_scenes = {'350': 'inference', 'seat': 'seat', 'cnc': 'cnc'}
+registry_scenes = 2
+registry_interval = 5
+# cascade: the cnn only runs if the laser trend or the mic/acc energy does not show an idle seat
+cascade = False
+cascade_mic_energy = 50.0
+cascade_acc_energy = 0.02
+# debug plots of datasave and featuresave: snapshot True dumps .npy files into snapshot_dir
+# (None is edge/assets/snapshots) and a Renderer process with nice snapshot_nice draws them
+# every snapshot_interval seconds, False draws them at once in the calling process
+snapshot = False
+snapshot_dir = None
+snapshot_interval = 5
+snapshot_nice = 10
 ####  RUNING INFORMATION ####
 # data visualization server information
 url = 'https://bohao.de/ecsk/datav'
-headers = {'content-type': "application/json"}
\ No newline at end of file
+headers = {'content-type': "application/json"}
+# background uplink: messages kept in the queue, seconds until a request times out,
+# retries of a failed message and their backoff(s), doubled after every retry
+uplink_depth = 4
+uplink_timeout = 5
+uplink_retries = 3
+uplink_backoff = 0.5
+uplink_backoff_max = 4
+# 'http' sends every message by a request to url, 'websocket' over one kept connection to ws_url,
+# at most uplink_rate messages per second, 0 sends every message as soon as it is produced
+uplink = 'http'
+ws_url = 'wss://bohao.de:8888'
+uplink_rate = 0
+# payload of the uplink: 'json' lists, or 'binary' float16 planes (uint8 if uplink_quantize)
+# compressed with zlib if uplink_compress, the server decodes it with datav/codec.py,
+# or 'batch' binary payloads of uplink_batch messages (at most 255) or of uplink_batch_ms, the slow
+# channels are only sent when they change
+uplink_format = 'json'
+uplink_quantize = False
+uplink_compress = True
+uplink_batch = 10
+uplink_batch_ms = 5000
+# messages which cannot be sent are kept on disk in segments of spool_segment bytes, at most
+# spool_size bytes, oldest deleted first, spool_dir None is edge/spool. the spool is tried
+# every spool_interval seconds while the server is down and replayed in batches of spool_batch,
+# at most spool_rate messages per second
+spool = True
+spool_dir = None
+spool_segment = 1 << 20
+spool_size = 64 << 20
+spool_interval = 10
+spool_batch = 20
+spool_rate = 10
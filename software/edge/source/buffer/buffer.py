@@ -0,0 +1,129 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to keep the latest raw samples of sensors in fixed ring buffers
+@ author: Bohao Chu
+'''
+import numpy as np
+
+
+'''
+@ name      : RingBuffer
+@ desc      : fixed float32 ring buffer with one row per channel, e.g. (x, y, z) of acc.
+              every sample is written twice, at head and at head + capacity, so the
+              latest n samples are always one contiguous slice of the array.
+@ parameter : capacity, the amount of samples kept for each channel
+              channels, the amount of channels
+              fill, the value of the placeholder samples
+@ return    :
+'''
+class RingBuffer:
+    def __init__(self, capacity, channels=1, fill=0, dtype=np.float32):
+        self.capacity = capacity
+        self.channels = channels
+        self.data = np.full((channels, 2 * capacity), fill, dtype=dtype)
+        # next write position, always in [0, capacity)
+        self.head = 0
+        # amount of samples written since creation
+        self.count = 0
+        # sequence of the writes, odd while a write is in progress, see snapshot
+        self.seq = 0
+
+    '''
+        @ name      : append
+        @ desc      : write one sample, O(1)
+        @ parameter : sample, a scalar for one channel or a sequence with one value per channel
+        @ return    : none
+    '''
+    def append(self, sample):
+        self.seq = self.seq + 1
+        self.data[:, self.head] = sample
+        self.data[:, self.head + self.capacity] = sample
+        self.head = (self.head + 1) % self.capacity
+        self.count = self.count + 1
+        self.seq = self.seq + 1
+
+    '''
+        @ name      : write
+        @ desc      : write a block of samples, O(n) in the block length and independent of the capacity
+        @ parameter : samples, (n,) for one channel or (n, channels), e.g. the output of MPU9250.readFIFO
+        @ return    : none
+    '''
+    def write(self, samples):
+        samples = np.asarray(samples)
+        samples = samples.reshape(len(samples), self.channels).T
+        amount = samples.shape[1]
+        self.seq = self.seq + 1
+        if amount >= self.capacity:
+            samples = samples[:, amount - self.capacity:]
+            self.data[:, :self.capacity] = samples
+            self.data[:, self.capacity:] = samples
+            self.head = 0
+        else:
+            first = min(amount, self.capacity - self.head)
+            rest = amount - first
+            self.data[:, self.head:self.head + first] = samples[:, :first]
+            self.data[:, self.head + self.capacity:self.head + self.capacity + first] = samples[:, :first]
+            self.data[:, :rest] = samples[:, first:]
+            self.data[:, self.capacity:self.capacity + rest] = samples[:, first:]
+            self.head = (self.head + amount) % self.capacity
+        self.count = self.count + amount
+        self.seq = self.seq + 1
+
+    '''
+        @ name      : latest
+        @ desc      : view of the latest n samples in time order, nothing is copied.
+                      the view is overwritten by later writes, copy it if it must stay unchanged.
+        @ parameter : n, the amount of samples, default is the capacity
+        @ return    : (n,) for one channel or (channels, n)
+    '''
+    def latest(self, n=None):
+        if n is None:
+            n = self.capacity
+        end = self.head + self.capacity
+        window = self.data[:, end - n:end]
+        if self.channels == 1:
+            return window[0]
+        return window
+
+    '''
+        @ name      : snapshot
+        @ desc      : copy the latest samples into out together with the sample count they end at.
+                      the copy is repeated if a write of the sampling thread was in progress or
+                      happened in between (seqlock on seq), so the samples are never torn and
+                      the count always matches them.
+        @ parameter : out, (n,) for one channel or (channels, n), e.g. a shared memory frame
+        @ return    : count of the buffer, i.e. the number of the last copied sample
+    '''
+    def snapshot(self, out):
+        while True:
+            seq = self.seq
+            if seq % 2:
+                continue
+            count = self.count
+            np.copyto(out, self.latest(out.shape[-1]))
+            if seq == self.seq:
+                return count
+
+
+    '''
+        @ name      : copy
+        @ desc      : consistent copy of the latest samples, for windows which leave the sampling
+                      process by a queue, which pickles them later on its feeder thread
+        @ parameter : n, the amount of samples, default is the capacity
+        @ return    : (n,) for one channel or (channels, n)
+    '''
+    def copy(self, n=None):
+        n = self.capacity if n is None else n
+        out = np.empty((self.channels, n), dtype=self.data.dtype)
+        self.snapshot(out)
+        return out[0] if self.channels == 1 else out
+
+
+if __name__ == "__main__":
+    ring = RingBuffer(5, channels=3)
+    for i in range(7):
+        ring.append((i, -i, 10 * i))
+    print(ring.latest(3))
+    ring.write(np.arange(12).reshape(4, 3))
+    print(ring.latest())
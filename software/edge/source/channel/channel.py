@@ -0,0 +1,186 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to pass sensor windows between processes
+@ author: Bohao Chu
+'''
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import queue
+import numpy as np
+
+
+# byte alignment of every field in shared memory
+_ALIGN = 64
+
+
+'''
+@ name      : SharedFrameChannel
+@ desc      : single producer, multi consumer channel backed by shared memory.
+              the producer writes windows in place into one of the slots, the consumers get
+              numpy views of the latest frame and its sequence number, nothing is pickled or copied.
+              a view stays unchanged until the producer claims the same slot again,
+              i.e. for the next (slots - 1) frames, check it with valid(seq) after using it.
+@ parameter : layout, {name: (shape, dtype)} of the fields in one frame
+              slots, the amount of frames kept in shared memory
+@ return    :
+'''
+class SharedFrameChannel:
+    def __init__(self, layout, slots=4):
+        self.layout = layout
+        self.slots = slots
+        self.offsets = {}
+        size = _ALIGN
+        for name, (shape, dtype) in layout.items():
+            self.offsets[name] = size
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            size = size + (nbytes + _ALIGN - 1) // _ALIGN * _ALIGN
+        self.frame_size = size - _ALIGN
+        self.memory = shared_memory.SharedMemory(create=True, size=_ALIGN + slots * self.frame_size)
+        self.cond = mp.Condition()
+        self._attach()
+        # [0] latest published sequence, [1] latest claimed sequence, 0 means none
+        self.header[:] = 0
+
+    def _attach(self):
+        self.header = np.ndarray((2,), dtype=np.int64, buffer=self.memory.buf)
+        self.frames = []
+        for slot in range(self.slots):
+            frame = {}
+            for name, (shape, dtype) in self.layout.items():
+                offset = slot * self.frame_size + self.offsets[name]
+                frame[name] = np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset)
+            self.frames.append(frame)
+
+    # the views can not be pickled, they are rebuilt when the channel is sent to a spawned process
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['header']
+        del state['frames']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    '''
+        @ name      : claim
+        @ desc      : writable views of the next frame, used by the producer only
+        @ parameter : none
+        @ return    : {name: ndarray}
+    '''
+    def claim(self):
+        seq = int(self.header[0]) + 1
+        self.header[1] = seq
+        return self.frames[seq % self.slots]
+
+    '''
+        @ name      : publish
+        @ desc      : make the claimed frame the latest one and wake up all consumers
+        @ parameter : none
+        @ return    : sequence number of the published frame
+    '''
+    def publish(self):
+        with self.cond:
+            self.header[0] = self.header[1]
+            self.cond.notify_all()
+        return int(self.header[0])
+
+    '''
+        @ name      : put
+        @ desc      : copy the given arrays into the next frame and publish it
+        @ parameter : data, {name: array_like}, fields which are not given keep the old values of the slot
+        @ return    : sequence number of the published frame
+    '''
+    def put(self, data):
+        frame = self.claim()
+        for name, value in data.items():
+            frame[name][...] = value
+        return self.publish()
+
+    '''
+        @ name      : get
+        @ desc      : wait for a frame newer than last
+        @ parameter : last, sequence number of the last frame of this consumer
+                      timeout, seconds to wait, None waits forever
+        @ return    : (seq, {name: ndarray}) of the latest frame, (last, None) on timeout
+    '''
+    def get(self, last=0, timeout=None):
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.header[0] > last, timeout):
+                return last, None
+            seq = int(self.header[0])
+        return seq, self.frames[seq % self.slots]
+
+    '''
+        @ name      : valid
+        @ desc      : check whether the views of frame seq have not been overwritten yet
+        @ parameter : seq, sequence number returned by get
+        @ return    : True or False
+    '''
+    def valid(self, seq):
+        return self.header[1] < seq + self.slots
+
+    def close(self):
+        self.header = None
+        self.frames = None
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+
+'''
+@ name      : Mailbox
+@ desc      : bounded "latest wins" queue between two processes. when it is full, put drops the
+              oldest item instead of blocking, so a slow consumer always gets fresh windows,
+              the latency stays bounded and the memory stays flat. drops are counted.
+@ parameter : depth, the amount of items kept
+@ return    :
+'''
+class Mailbox:
+    def __init__(self, depth=1):
+        self.depth = depth
+        self.queue = mp.Queue(maxsize=depth)
+        self.dropped = mp.Value('l', 0)
+
+    '''
+        @ name      : put
+        @ desc      : put an item, never blocks, the oldest item is dropped if the mailbox is full
+        @ parameter : item
+        @ return    : none
+    '''
+    def put(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    with self.dropped.get_lock():
+                        self.dropped.value = self.dropped.value + 1
+                except queue.Empty:
+                    # the consumer took it in the meantime
+                    pass
+
+    def get(self, block=True, timeout=None):
+        return self.queue.get(block, timeout)
+
+    def get_nowait(self):
+        return self.queue.get_nowait()
+
+    def empty(self):
+        return self.queue.empty()
+
+    def full(self):
+        return self.queue.full()
+
+    def qsize(self):
+        return self.queue.qsize()
+
+    def drops(self):
+        return self.dropped.value
+
+    def cancel_join_thread(self):
+        self.queue.cancel_join_thread()
@@ -17,6 +17,7 @@ import qwiic
 import time, statistics
 import tflite_runtime.interpreter as tflite
 import numpy as np
+import buffer.buffer as rb
 
 
 ToF = qwiic.QwiicVL53L1X()
@@ -37,23 +38,13 @@ time.sleep(1)
 open_interpreter = tflite.Interpreter(model_path="../tflite_model/spin.tflite")
 open_interpreter.allocate_tensors()
 
-mpu_x = [0 for j in range(1000)]
-mpu_y = [0 for j in range(1000)]
-mpu_z = [0 for j in range(1000)]
-audio_data = [0 for j in range(8000)]
+mpu_data = rb.RingBuffer(1000, channels=3)
+audio_data = rb.RingBuffer(8000)
 dis_data = 1
 def mpu():
-    global mpu_x
-    global mpu_y
-    global mpu_z
     while True:
         acc = mpu9250.readAccel()
-        mpu_x.append(acc['x'])
-        mpu_y.append(acc['y'])
-        mpu_z.append(acc['z'])
-        del(mpu_x[0])
-        del(mpu_y[0])
-        del(mpu_z[0])
+        mpu_data.append((acc['x'], acc['y'], acc['z']))
 
 
 def dis():
@@ -78,25 +69,21 @@ def dis():
 
 
 def mic():
-    global audio_data
     while True:
         data_chunks, data_frames, start_time = md.data_grabber(stream, 0.5)
-        audio_data = data_chunks[0].tolist()
+        audio_data.write(data_chunks[0])
 
 
 def tflit():
-    global audio_data
     global dis_data
-    global mpu_x
-    global mpu_y
-    global mpu_z
     while True:
         input_details = open_interpreter.get_input_details()
         output_details = open_interpreter.get_output_details()
 
         # 260ms
         start = time.time()
-        merge_feature = tfLite.feature(audio_data, dis_data, mpu_x, mpu_y, mpu_z)
+        mpu_x, mpu_y, mpu_z = mpu_data.latest()
+        merge_feature = tfLite.feature(audio_data.latest(), dis_data, mpu_x, mpu_y, mpu_z)
 
         # Test the model on random input data.
         # RPI4 USB3.0
@@ -13,6 +13,7 @@ import matplotlib.pyplot as plt
 from multiprocessing import Process
 from multiprocessing import Pipe
 import scipy.signal
+import buffer.buffer as rb
 mpu = mpuD.MPU9250()
 time.sleep(3)
 audio = pyaudio.PyAudio()
@@ -25,48 +26,28 @@ stream = audio.open(format=pyaudio.paInt16,
 stream.stop_stream()
 time.sleep(3)
 
-acc_x_todo = [1 for i in range(2000)]
-acc_y_todo = [1 for i in range(2000)]
-acc_z_todo = [1 for i in range(2000)]
+acc_todo = rb.RingBuffer(2000, channels=3, fill=1)
 
-gyr_x_todo = [1 for i in range(2000)]
-gyr_y_todo = [1 for i in range(2000)]
-gyr_z_todo = [1 for i in range(2000)]
+gyr_todo = rb.RingBuffer(2000, channels=3, fill=1)
 
-mic_todo = [1 for i in range(15000)]
+mic_todo = rb.RingBuffer(15000, fill=1)
 
 def mpu_acc():
-    global acc_x_todo
-    global acc_y_todo
-    global acc_z_todo
     print("MPU_ACC Start")
     while True:
         start = time.time()
         acc = mpu.readAccel()
-        del acc_x_todo[0]
-        del acc_y_todo[0]
-        del acc_z_todo[0]
-        acc_x_todo.append(acc['x'])
-        acc_y_todo.append(acc['y'])
-        acc_z_todo.append(acc['z'])
+        acc_todo.append((acc['x'], acc['y'], acc['z']))
         #print("acc", time.time() - start)
 
 
 
 # 1KHz
 def mpu_gyr():
-    global gyr_x_todo
-    global gyr_y_todo
-    global gyr_z_todo
     while True:
         start = time.time()
         gyr = mpu.readGyro()
-        del gyr_x_todo[0]
-        del gyr_y_todo[0]
-        del gyr_z_todo[0]
-        gyr_x_todo.append(gyr['x'])
-        gyr_y_todo.append(gyr['y'])
-        gyr_z_todo.append(gyr['z'])
+        gyr_todo.append((gyr['x'], gyr['y'], gyr['z']))
         #print("gyr:", time.time()-start)
 
 
@@ -108,24 +89,20 @@ def laser():
 
 # 15KHz = 10Hz * 1500
 def mic():
-    global mic_todo
     print("INMP441: MIC STAR\n")
     stream.start_stream()
     # plot
     while stream.is_active():
         start = time.time()
         stream_data = stream.read(chunk, exception_on_overflow=False)
-        del mic_todo[:3000]
-        mic_todo.extend(np.frombuffer(stream_data, dtype=np.int16))
+        mic_todo.write(np.frombuffer(stream_data, dtype=np.int16))
     stream.stop_stream()
 
 
 def stft_acc():
-    global acc_x_todo
-    global acc_y_todo
-    global acc_z_todo
     while True:
         start = time.time()
+        acc_x_todo, acc_y_todo, acc_z_todo = acc_todo.latest()
         #scipy.signal.stft(acc_x_todo, fs=2000, nperseg=256, noverlap=32, boundary=None, padded=None)
         _, _, ps = scipy.signal.stft(acc_y_todo, fs=2000,
                                      window='hann',
@@ -136,11 +113,9 @@ def stft_acc():
         time.sleep(1)
 
 def stft_gyr():
-    global gyr_x_todo
-    global gyr_y_todo
-    global gyr_z_todo
     while True:
         start = time.time()
+        gyr_x_todo, gyr_y_todo, gyr_z_todo = gyr_todo.latest()
         scipy.signal.stft(gyr_x_todo, fs=2000, nperseg=256, noverlap=32, boundary=None, padded=None)
         scipy.signal.stft(gyr_y_todo, fs=2000, nperseg=256, noverlap=32, boundary=None, padded=None)
         scipy.signal.stft(gyr_z_todo, fs=2000, nperseg=256, noverlap=32, boundary=None, padded=None)
@@ -148,14 +123,13 @@ def stft_gyr():
         time.sleep(1)
 
 def stft_mic():
-    global mic_todo
     while True:
         start = time.time()
-        f, t, zxx = scipy.signal.stft(mic_todo,
+        f, t, zxx = scipy.signal.stft(mic_todo.latest(),
                                      fs=15000,
                                      window='hann',
                                      nperseg=512, noverlap=256, boundary=None, padded=None)
-        print("mic_stft:", zxx.shape, mic_todo[:5], time.time() - start)
+        print("mic_stft:", zxx.shape, mic_todo.latest(5), time.time() - start)
 
 
 def data_process_multi_thread():
@@ -211,8 +185,8 @@ son2_p = Process(target= data_process_multi_thread)
 son2_p.start()
 out_pipe.close()
 while True:
-    print("mian:", mic_todo[:5])
-    in_pipe.send(mic_todo)
+    print("mian:", mic_todo.latest(5))
+    in_pipe.send(mic_todo.copy())
 in_pipe.close()
 son1_p.join()
 son2_p.join()
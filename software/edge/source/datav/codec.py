@@ -0,0 +1,275 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to encode the data visualization messages as compact binary payloads
+@ author: Bohao Chu
+'''
+import struct
+import zlib
+import numpy as np
+
+
+# payload layout, version 2, little endian:
+# header  : magic b'EC', version u8, flags u8
+# body    : time t f64 (version 2), planes m, x, y, z (6, 64) and eye e (48,), each float16,
+#           or uint8 after (min f32, scale f32), l, ld f32, color (3,), bme (3,), mag (4,) f32,
+#           activity u8 length + comma separated utf8
+# batch   : (FLAG_BATCH) amount of frames u8, then per frame a mask u8 and the body of the frame
+#           without the slow sections which equal the ones of the previous frame, bit i of the
+#           mask is set if SLOW[i] is sent. a sent eye plane is xor-ed with the previous one.
+#           the first frame of a batch is complete, every batch is decoded on its own.
+# the body is zlib compressed if FLAG_ZLIB is set
+MAGIC = b'EC'
+VERSION = 2
+FLAG_ZLIB = 0x01
+FLAG_UINT8 = 0x02
+FLAG_BATCH = 0x04
+
+# frames of one batch, the amount is a u8
+MAX_BATCH = 255
+
+_HEADER = struct.Struct('<2sBB')
+_RANGE = struct.Struct('<ff')
+_TIME = struct.Struct('<d')
+PLANES = {'m': (6, 64), 'x': (6, 64), 'y': (6, 64), 'z': (6, 64), 'e': (48,)}
+SCALARS = ['l', 'ld']
+VECTORS = {'color': 3, 'bme': 3, 'mag': 4}
+# sections of a frame in the order of the body, 'l' holds all SCALARS
+SECTIONS = ['t'] + list(PLANES) + ['l'] + list(VECTORS) + ['activity']
+# sections which change slowly between two frames
+SLOW = ['e', 'l', 'color', 'bme', 'mag', 'activity']
+
+
+def _plane(value, quantize):
+    value = np.asarray(value, dtype=np.float32).reshape(-1)
+    if not quantize:
+        return value.astype('<f2').tobytes()
+    low = float(value.min())
+    scale = float(value.max() - low) / 255 or 1.0
+    q = np.rint((value - low) / scale).astype(np.uint8)
+    return _RANGE.pack(low, scale) + q.tobytes()
+
+
+def _sections(data, quantize):
+    sections = {'t': _TIME.pack(data['t'])}
+    for name in PLANES:
+        sections[name] = _plane(data[name], quantize)
+    sections['l'] = np.array([data[name] for name in SCALARS], dtype='<f4').reshape(-1).tobytes()
+    for name, size in VECTORS.items():
+        sections[name] = np.asarray(data[name], dtype='<f4').reshape(size).tobytes()
+    activity = ','.join(data['activity']).encode('utf-8')
+    sections['activity'] = struct.pack('<B', len(activity)) + activity
+    return sections
+
+
+def _size(name, flags, body, offset):
+    if name == 't':
+        return _TIME.size
+    if name in PLANES:
+        size = int(np.prod(PLANES[name]))
+        return _RANGE.size + size if flags & FLAG_UINT8 else 2 * size
+    if name == 'l':
+        return 4 * len(SCALARS)
+    if name in VECTORS:
+        return 4 * VECTORS[name]
+    return 1 + body[offset]
+
+
+def _xor(a, b):
+    return (np.frombuffer(a, np.uint8) ^ np.frombuffer(b, np.uint8)).tobytes()
+
+
+def _pack(flags, body, compress):
+    if compress:
+        body = zlib.compress(body, 1)
+    return _HEADER.pack(MAGIC, VERSION, flags) + body
+
+
+def _unpack(payload):
+    magic, version, flags = _HEADER.unpack_from(payload)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError(f"unknown payload {magic} version {version}")
+    body = memoryview(payload)[_HEADER.size:]
+    if flags & FLAG_ZLIB:
+        body = memoryview(zlib.decompress(body))
+    return version, flags, body
+
+
+'''
+@ name      : encode
+@ desc      : binary payload of one data visualization message
+@ parameter : data, {'t': unix time, 'm', 'x', 'y', 'z': (6, 64), 'e': (48,), 'l', 'ld': float,
+                     'color', 'bme', 'mag': values, 'activity': [names]}
+              quantize, True stores the planes as uint8 with their range, False as float16
+              compress, True compresses the body with zlib
+@ return    : bytes
+'''
+def encode(data, quantize=False, compress=True):
+    flags = (FLAG_ZLIB if compress else 0) | (FLAG_UINT8 if quantize else 0)
+    return _pack(flags, b''.join(_sections(data, quantize).values()), compress)
+
+
+'''
+@ name      : encode_batch
+@ desc      : binary payload of several consecutive messages, the slow sections are only sent
+              when they change and the whole batch is compressed at once
+@ parameter : frames, [message], see encode, at most MAX_BATCH
+              quantize, see encode
+              compress, see encode
+@ return    : bytes
+'''
+def encode_batch(frames, quantize=False, compress=True):
+    if len(frames) > MAX_BATCH:
+        raise ValueError(f"{len(frames)} frames, a batch holds at most {MAX_BATCH}")
+    flags = FLAG_BATCH | (FLAG_ZLIB if compress else 0) | (FLAG_UINT8 if quantize else 0)
+    body = [struct.pack('<B', len(frames))]
+    previous = {}
+    for data in frames:
+        sections = _sections(data, quantize)
+        mask = 0
+        parts = []
+        for name, section in sections.items():
+            if name in SLOW:
+                if section == previous.get(name):
+                    continue
+                mask = mask | (1 << SLOW.index(name))
+                if name == 'e' and previous:
+                    section = _xor(section, previous['e'])
+            parts.append(section)
+        body.append(struct.pack('<B', mask))
+        body.extend(parts)
+        previous = sections
+    return _pack(flags, b''.join(body), compress)
+
+
+def _parse(body, flags, version):
+    data = {'t': 0.0}
+    offset = 0
+    if version >= 2:
+        data['t'] = _TIME.unpack_from(body)[0]
+        offset = _TIME.size
+    for name, shape in PLANES.items():
+        size = int(np.prod(shape))
+        if flags & FLAG_UINT8:
+            low, scale = _RANGE.unpack_from(body, offset)
+            offset = offset + _RANGE.size
+            q = np.frombuffer(body, dtype=np.uint8, count=size, offset=offset)
+            data[name] = (q * np.float32(scale) + np.float32(low)).reshape(shape)
+            offset = offset + size
+        else:
+            data[name] = np.frombuffer(body, dtype='<f2', count=size, offset=offset).astype(np.float32).reshape(shape)
+            offset = offset + 2 * size
+    for name, value in zip(SCALARS, np.frombuffer(body, dtype='<f4', count=len(SCALARS), offset=offset)):
+        data[name] = float(value)
+    offset = offset + 4 * len(SCALARS)
+    for name, size in VECTORS.items():
+        data[name] = np.frombuffer(body, dtype='<f4', count=size, offset=offset).copy()
+        offset = offset + 4 * size
+    length = body[offset]
+    activity = bytes(body[offset + 1:offset + 1 + length]).decode('utf-8')
+    data['activity'] = activity.split(',') if activity else []
+    return data
+
+
+'''
+@ name      : decode
+@ desc      : message of a binary payload, used by the receivers
+@ parameter : payload, bytes made by encode
+@ return    : {'t': unix time, 0 for version 1, 'm', 'x', 'y', 'z': (6, 64) float32, 'e': (48,) float32,
+               'l', 'ld': float,
+               'color', 'bme', 'mag': float32 arrays, 'activity': [names]}
+'''
+def decode(payload):
+    version, flags, body = _unpack(payload)
+    if flags & FLAG_BATCH:
+        raise ValueError("batch payload, see decode_batch")
+    return _parse(body, flags, version)
+
+
+'''
+@ name      : decode_batch
+@ desc      : messages of a binary payload made by encode_batch or by encode
+@ parameter : payload, bytes
+@ return    : [message], see decode
+'''
+def decode_batch(payload):
+    version, flags, body = _unpack(payload)
+    if not flags & FLAG_BATCH:
+        return [_parse(body, flags, version)]
+    frames = []
+    previous = {}
+    offset = 1
+    for i in range(body[0]):
+        mask = body[offset]
+        offset = offset + 1
+        sections = {}
+        for name in SECTIONS:
+            if name in SLOW and not mask & (1 << SLOW.index(name)):
+                sections[name] = previous[name]
+                continue
+            size = _size(name, flags, body, offset)
+            section = bytes(body[offset:offset + size])
+            offset = offset + size
+            if name == 'e' and previous:
+                section = _xor(section, previous['e'])
+            sections[name] = section
+        frames.append(_parse(b''.join(sections.values()), flags, version))
+        previous = sections
+    return frames
+
+
+if __name__ == "__main__":
+    import json
+    import time
+    data = {'t': time.time(), 'm': np.random.randn(6, 64), 'x': np.random.randn(6, 64), 'y': np.random.randn(6, 64),
+            'z': np.random.randn(6, 64), 'e': np.random.rand(48) * 30, 'l': 1.0, 'ld': 35.2,
+            'color': [120, 80, 60], 'bme': [23.5, 40.1, 1001.3], 'mag': [0, 12, -3, 40], 'activity': ['spin']}
+    start = time.time()
+    text = json.dumps({k: np.asarray(v).reshape(-1).tolist() if k in PLANES else v for k, v in data.items()})
+    print(f"json          : {len(text)} bytes, {1000 * (time.time() - start):.2f} ms")
+    for quantize in (False, True):
+        start = time.time()
+        payload = encode(data, quantize=quantize)
+        spent = 1000 * (time.time() - start)
+        back = decode(payload)
+        error = max(np.max(np.abs(back[k] - np.asarray(data[k]).reshape(PLANES[k]))) for k in PLANES)
+        print(f"{'uint8' if quantize else 'float16'} + zlib  : {len(payload)} bytes, {spent:.2f} ms, "
+              f"{len(text) / len(payload):.1f}x smaller, max error {error:.4f}, activity {back['activity']}, "
+              f"time {back['t'] == data['t']}")
+        # round trip: float16 keeps about 3 digits, uint8 is within half a step of the range of a plane
+        for k in PLANES:
+            value = np.asarray(data[k], dtype=np.float32).reshape(PLANES[k])
+            bound = float(np.ptp(value)) / 255 / 2 + 1e-5 if quantize else float(np.max(np.abs(value))) * 1e-3
+            assert np.max(np.abs(back[k] - value)) <= bound, k
+        assert back['t'] == data['t'] and back['activity'] == data['activity']
+        assert back['l'] == data['l'] and back['ld'] == np.float32(data['ld'])
+        for k in VECTORS:
+            assert np.array_equal(back[k], np.asarray(data[k], dtype=np.float32)), k
+        # uncompressed, no activity and the batch reader of a single payload
+        single = dict(data, activity=[])
+        for back in (decode(encode(single, quantize=quantize, compress=False)), decode_batch(encode(single))[0]):
+            assert back['activity'] == [] and back['t'] == data['t']
+
+    # 10 frames of 0.5s, the slow channels change now and then, one pixel of the eye per frame
+    frames = []
+    for i in range(10):
+        frame = dict(data, t=data['t'] + 0.5 * i, m=np.random.randn(6, 64), x=np.random.randn(6, 64),
+                     y=np.random.randn(6, 64), z=np.random.randn(6, 64), e=data['e'].copy(), ld=35.2 + i // 4,
+                     activity=['spin'] if i < 5 else ['spin', 'upward'])
+        frame['e'][i] = frame['e'][i] + 1
+        frames.append(frame)
+    texts = sum(len(json.dumps({k: np.asarray(v).reshape(-1).tolist() if k in PLANES else v for k, v in f.items()}))
+                for f in frames)
+    for quantize in (False, True):
+        singles = sum(len(encode(f, quantize=quantize)) for f in frames)
+        payload = encode_batch(frames, quantize=quantize)
+        back = decode_batch(payload)
+        same = all(np.array_equal(b[k], decode(encode(f, quantize=quantize))[k])
+                   for b, f in zip(back, frames) for k in SECTIONS if k not in ('l', 'activity'))
+        same = same and [(b['ld'], b['activity']) for b in back] == \
+            [(np.float32(f['ld']), f['activity']) for f in frames]
+        print(f"{'uint8' if quantize else 'float16'} batch of {len(frames)}: {len(payload)} bytes in 1 request, "
+              f"{singles} bytes in {len(frames)} single payloads, {texts} bytes in {len(frames)} json requests, "
+              f"{texts / len(payload):.1f}x smaller, same frames {same}")
+        assert same and len(back) == len(frames)
+        assert [b['t'] for b in back] == [f['t'] for f in frames]
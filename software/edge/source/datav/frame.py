@@ -0,0 +1,86 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to build the planes of the dashboard from the features of one window
+@ author: Bohao Chu
+'''
+import numpy as np
+
+
+# columns of zeros in front of the 60 frames of a plane, 6 * 64 on the dashboard
+PAD = 4
+
+
+'''
+@ name      : FrameBuilder
+@ desc      : planes of the dashboard, written into preallocated buffers. the 60 * 60 mic
+              feature is reduced to 6 * 60 by one reshape and sum, the acc features are copied
+              transposed behind the zero columns and the eye frame is cut to 6 * 8, all channels
+              of a window in one call and without temporary lists.
+              the planes are views of the buffers and are overwritten by the next build,
+              a caller which keeps them copies them.
+@ parameter : none
+@ return    :
+'''
+class FrameBuilder:
+    def __init__(self):
+        self.m = np.zeros((6, 64), dtype=np.float32)
+        # x, y, z planes of the acc axes
+        self.acc = np.zeros((3, 6, 64), dtype=np.float32)
+        self.e = np.zeros(48, dtype=np.float32)
+
+    '''
+        @ name      : build
+        @ desc      : planes of one window
+        @ parameter : mic_feature, (60, 66) mic feature, the first 6 columns are skipped
+                      acc_features, [(60, 8)] acc features of x, y and z, the first 2 columns are skipped
+                      eye_data, (64,) 8 * 8 eye frame
+        @ return    : m, x, y, z (6, 64) and e (48,)
+    '''
+    def build(self, mic_feature, acc_features, eye_data):
+        # 60 * 60 => 60 * 6 bands of 10 => 6 * 60, twice the mean of a band is its sum / 5
+        m = self.m[:, PAD:]
+        np.sum(np.asarray(mic_feature)[:, 6:].reshape(60, 6, 10), axis=2, out=m.T)
+        m *= 0.2
+        # 60 * 8 => 6 * 60
+        for plane, feature in zip(self.acc, acc_features):
+            np.copyto(plane[:, PAD:], np.asarray(feature)[:, 2:].T)
+        # 8 * 8 => 6 * 8
+        np.copyto(self.e.reshape(6, 8), np.asarray(eye_data).reshape(8, 8)[:, 1:7].T)
+        return self.m, self.acc[0], self.acc[1], self.acc[2], self.e
+
+
+if __name__ == "__main__":
+    import time
+
+    # the planes as featurev built them before
+    def reference(mic_feature, acc_x_feature, acc_y_feature, acc_z_feature, eye_data):
+        mic_data = mic_feature[:, 6:]
+        m = []
+        for i in range(0, 60, 10):
+            m.append(np.mean(mic_data[:, i:i + 10], 1))
+        t = np.zeros((6, 4))
+        m = np.concatenate((t, np.array(m)), axis=1)
+        acc_x_data = np.transpose(acc_x_feature[:, 2:])
+        acc_y_data = np.transpose(acc_y_feature[:, 2:])
+        acc_z_data = np.transpose(acc_z_feature[:, 2:])
+        t = np.zeros((6, 4))
+        x = np.concatenate((t, acc_x_data), axis=1)
+        y = np.concatenate((t, acc_y_data), axis=1)
+        z = np.concatenate((t, acc_z_data), axis=1)
+        e = np.array(eye_data).reshape(8, 8)[:, 1:7].transpose().reshape(-1)
+        return 2 * m, x, y, z, e
+
+    mic = np.random.randn(60, 66).astype(np.float32)
+    acc = np.random.randn(3, 60, 8).astype(np.float32)
+    eye = list(np.random.rand(64) * 30)
+    builder = FrameBuilder()
+    planes = builder.build(mic, acc, eye)
+    error = max(np.max(np.abs(a - b)) for a, b in zip(planes, reference(mic, acc[0], acc[1], acc[2], eye)))
+    print(f"max difference to the reference: {error:.2e}")
+    for name, run in [('reference', lambda: reference(mic, acc[0], acc[1], acc[2], eye)),
+                      ('builder', lambda: builder.build(mic, acc, eye))]:
+        start = time.perf_counter()
+        for i in range(2000):
+            run()
+        print(f"{name:10s}: {1e6 * (time.perf_counter() - start) / 2000:.1f} us per window")
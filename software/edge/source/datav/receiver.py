@@ -0,0 +1,228 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is a local stand-in of the data visualization server, it decodes the uplink messages
+@ author: Bohao Chu
+'''
+import os
+import json
+import time
+import base64
+import socket
+import threading
+import struct
+import hashlib
+import argparse
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import numpy as np
+# run as a script next to codec.py, the datav directory is the first path
+import codec as cd
+
+
+# key suffix of the websocket handshake, RFC 6455
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+'''
+@ name      : summary
+@ desc      : print one received message
+@ parameter : kind, how the message came, e.g. 'POST'
+              size, bytes of the message
+              data, the decoded message
+@ return    : the message
+'''
+def summary(kind, size, data):
+    shapes = {k: np.shape(v) for k, v in data.items() if k in cd.PLANES}
+    age = time.time() - data.get('t', time.time())
+    print(f"# {kind} {size} bytes, age {age:.1f}s, planes {shapes}, laser {data['l']}, activity {data['activity']}")
+    return data
+
+
+'''
+@ name      : summaries
+@ desc      : print the messages of one binary payload, a batch or a single message
+@ parameter : kind, how the payload came, e.g. 'POST'
+              payload, bytes made by codec.encode or codec.encode_batch
+@ return    : the messages
+'''
+def summaries(kind, payload):
+    frames = cd.decode_batch(payload)
+    for i, data in enumerate(frames):
+        summary(f"{kind} {i + 1}/{len(frames)}" if len(frames) > 1 else kind, len(payload), data)
+    return frames
+
+
+'''
+@ name      : Handler
+@ desc      : /datav of the dashboard server, json messages by GET and binary payloads by POST.
+              every message is decoded and summarized, so the round trip of the edge can be
+              checked without the dashboard server, e.g. url = 'http://localhost:8080/datav'
+@ parameter :
+@ return    :
+'''
+class Handler(BaseHTTPRequestHandler):
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('content-length', 0)))
+
+    def _ok(self):
+        self.send_response(200)
+        self.send_header('content-length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        body = self._body()
+        summary(self.command, len(body), json.loads(body))
+        self._ok()
+
+    def do_POST(self):
+        body = self._body()
+        try:
+            summaries(self.command, body)
+        except (ValueError, KeyError, IndexError) as e:
+            print(f"# payload is not decoded: {e}")
+            self.send_response(400)
+            self.end_headers()
+            return
+        self._ok()
+
+    def log_message(self, format, *args):
+        pass
+
+
+'''
+@ name      : StreamHandler
+@ desc      : websocket server of the dashboard without tls, json text frames and binary payloads of
+              codec.py are decoded, e.g. ws_url = 'ws://localhost:8888'. the messages of the edge
+              are small and never fragmented, so every frame is one message.
+              the decoded messages are appended to server.messages if the server has that list.
+@ parameter :
+@ return    :
+'''
+class StreamHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.rfile.readline()
+        headers = {}
+        for line in iter(self.rfile.readline, b'\r\n'):
+            if not line:
+                return
+            name, value = line.decode('latin-1').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + GUID).encode()).digest()).decode()
+        self.wfile.write(f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                         f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode())
+        print(f"# websocket connection open from {self.client_address[0]}")
+        messages = 0
+        while True:
+            opcode, payload = self._frame()
+            # 0x8 close, None the connection is lost
+            if opcode is None or opcode == 0x8:
+                break
+            try:
+                if opcode == 0x1:
+                    frames = [summary('text', len(payload), json.loads(payload))]
+                elif opcode == 0x2:
+                    frames = summaries('binary', payload)
+                else:
+                    frames = []
+                getattr(self.server, 'messages', []).extend(frames)
+            except (ValueError, KeyError, IndexError) as e:
+                print(f"# message is not decoded: {e}")
+            messages = messages + 1
+        print(f"# websocket connection closed after {messages} messages")
+
+    def _frame(self):
+        head = self.rfile.read(2)
+        if len(head) < 2:
+            return None, None
+        length = head[1] & 0x7f
+        if length == 126:
+            length = struct.unpack('>H', self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if head[1] & 0x80 else None
+        payload = self.rfile.read(length)
+        if mask is not None:
+            payload = (np.frombuffer(payload, np.uint8) ^ np.resize(np.frombuffer(mask, np.uint8), length)).tobytes()
+        return head[0] & 0x0f, payload
+
+
+def _send_frame(sock, opcode, payload):
+    # client frames are masked, RFC 6455 5.3
+    length = len(payload)
+    if length < 126:
+        head = struct.pack('>BB', 0x80 | opcode, 0x80 | length)
+    elif length < 65536:
+        head = struct.pack('>BBH', 0x80 | opcode, 0x80 | 126, length)
+    else:
+        head = struct.pack('>BBQ', 0x80 | opcode, 0x80 | 127, length)
+    mask = os.urandom(4)
+    masked = (np.frombuffer(payload, np.uint8) ^ np.resize(np.frombuffer(mask, np.uint8), length)).tobytes()
+    sock.sendall(head + mask + masked)
+
+
+'''
+@ name      : check
+@ desc      : round trip of the websocket receiver. a minimal client does the handshake and sends
+              a json text frame, a single binary payload and an uncompressed batch with an extended
+              length, the messages decoded by StreamHandler have to equal the sent ones.
+@ parameter : none
+@ return    : none, an AssertionError if a message differs
+'''
+def check():
+    data = {'t': time.time(), 'm': np.random.randn(6, 64), 'x': np.random.randn(6, 64), 'y': np.random.randn(6, 64),
+            'z': np.random.randn(6, 64), 'e': np.random.rand(48) * 30, 'l': 1.0, 'ld': 35.25,
+            'color': [120, 80, 60], 'bme': [23.5, 40.25, 1001.5], 'mag': [0, 12, -3, 40], 'activity': ['spin']}
+    frames = [dict(data, t=data['t'] + 0.5 * i, m=np.random.randn(6, 64), activity=['spin'] if i < 2 else [])
+              for i in range(4)]
+    text = json.dumps({k: np.asarray(v).reshape(-1).tolist() if k in cd.PLANES else v for k, v in data.items()})
+    server = socketserver.ThreadingTCPServer(('localhost', 0), StreamHandler)
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    key = base64.b64encode(os.urandom(16)).decode()
+    with socket.create_connection(server.server_address, timeout=5) as sock:
+        sock.sendall(f"GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode())
+        answer = b''
+        while not answer.endswith(b'\r\n\r\n'):
+            answer = answer + sock.recv(1)
+        accept = base64.b64encode(hashlib.sha1((key + GUID).encode()).digest()).decode()
+        assert answer.startswith(b'HTTP/1.1 101') and f"Sec-WebSocket-Accept: {accept}".encode() in answer
+        _send_frame(sock, 0x1, text.encode())
+        _send_frame(sock, 0x2, cd.encode(data))
+        batch = cd.encode_batch(frames, compress=False)
+        assert len(batch) > 125
+        _send_frame(sock, 0x2, batch)
+        _send_frame(sock, 0x8, b'')
+        deadline = time.time() + 5
+        while len(server.messages) < 2 + len(frames) and time.time() < deadline:
+            time.sleep(0.01)
+    server.shutdown()
+    server.server_close()
+    received = server.messages
+    assert len(received) == 2 + len(frames), len(received)
+    assert json.dumps({k: np.asarray(v).reshape(-1).tolist() if k in cd.PLANES else v for k, v in received[0].items()}) == text
+    expected = [cd.decode(cd.encode(data))] + [cd.decode(cd.encode(f)) for f in frames]
+    for back, sent in zip(received[1:], expected):
+        for k in cd.SECTIONS:
+            assert np.array_equal(back[k], sent[k]), k
+        assert back['ld'] == sent['ld']
+    print(f"# websocket round trip of {len(received)} messages is ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--websocket', action='store_true', help='websocket server instead of /datav')
+    parser.add_argument('--check', action='store_true', help='round trip of the websocket server and exit')
+    args = parser.parse_args()
+    if args.check:
+        check()
+    elif args.websocket:
+        print(f"# receiver listens on ws://localhost:{args.port}")
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        socketserver.ThreadingTCPServer(('', args.port), StreamHandler).serve_forever()
+    else:
+        print(f"# receiver listens on http://localhost:{args.port}/datav")
+        HTTPServer(('', args.port), Handler).serve_forever()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to send the data visualization messages in the background
+@ author: Bohao Chu
+'''
+import os, sys
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(SOURCE_DIR)
+import time
+import threading
+from collections import deque
+import requests
+import datav.spool as sp
+import datav.codec as cd
+import arguments as arg
+
+
+'''
+@ name      : Sender
+@ desc      : background sender of one process. send() only puts the message into a bounded queue,
+              the oldest message is dropped if the queue is full, and returns at once.
+              a daemon thread sends the messages over one requests.Session, so the connection
+              is kept alive and reused, and retries a failed message with exponential backoff.
+              at most arg.uplink_rate messages are sent per second, the newest message is taken.
+              a message which still fails is kept in a Spool on disk if arg.spool is True, and
+              the following messages go straight into the spool until the server is reached
+              again. the spool is replayed oldest first in batches of arg.spool_batch between
+              the live messages, at most arg.spool_rate messages per second.
+              a message which the server rejects with a 4xx answer is dropped at once, it is
+              neither retried nor spooled, only lost connections, timeouts and 5xx answers are.
+              if arg.uplink_format is 'batch' the messages are collected until arg.uplink_batch
+              messages or arg.uplink_batch_ms passed, then they are sent as one payload of
+              codec.encode_batch, see datav/codec.py. while the thread is busy, the oldest
+              message of a full batch is dropped, like the oldest one of the queue.
+              sent, dropped and failed messages and the latency are printed every period seconds.
+@ parameter : url, url of the data visualization server, default arg.url
+              depth, amount of messages kept in the queue, default arg.uplink_depth
+              period, seconds between two reports, 0 disables the report, default arg.stats_period
+@ return    :
+'''
+class Sender:
+    def __init__(self, url=None, depth=None, period=None):
+        self.url = arg.url if url is None else url
+        self.queue = deque(maxlen=arg.uplink_depth if depth is None else depth)
+        self.period = arg.stats_period if period is None else period
+        self.cond = threading.Condition()
+        self._open()
+        self.next = 0
+        self.spool = sp.Spool() if arg.spool else None
+        # True while the server is not reached, the time of the next batch of the spool
+        self.down = False
+        self.drain_at = 0
+        # messages of the next batch, the time it is sent at the latest and its size
+        self.frames = []
+        self.batch_size = min(arg.uplink_batch, cd.MAX_BATCH)
+        self.batch_at = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.latency = []
+        self.since = time.perf_counter()
+        # a forked child must create its own sender, the thread is not forked with it
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    '''
+        @ name      : send
+        @ desc      : queue one message, never blocks
+        @ parameter : data, json message, or bytes of a binary payload
+        @ return    : none
+    '''
+    def send(self, data):
+        with self.cond:
+            if arg.uplink_format == 'batch' and not isinstance(data, bytes):
+                if not self.frames:
+                    self.batch_at = time.perf_counter() + arg.uplink_batch_ms / 1000
+                if len(self.frames) >= self.batch_size:
+                    self.frames.pop(0)
+                    self.dropped = self.dropped + 1
+                self.frames.append(data)
+                # the first message sets the deadline the thread waits for, a full batch goes at once
+                if len(self.frames) == 1 or len(self.frames) >= self.batch_size:
+                    self.cond.notify()
+                return
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped = self.dropped + 1
+            self.queue.append(data)
+            self.cond.notify()
+
+    def _open(self):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(arg.headers)
+
+    def _run(self):
+        while True:
+            delay = self.next - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            with self.cond:
+                # woken by a message, the timeout is computed again by the next loop
+                if not (self.queue or self._ready()):
+                    self.cond.wait(self._timeout())
+                # the messages queued while waiting for the rate replace each other
+                while arg.uplink_rate and len(self.queue) > 1:
+                    self.queue.popleft()
+                    self.dropped = self.dropped + 1
+                data = self.queue.popleft() if self.queue else None
+                frames = None
+                if data is None and self._ready():
+                    frames, self.frames = self.frames, []
+            if frames:
+                # the batch is encoded by the sender thread, the caller never waits for it
+                data = cd.encode_batch(frames, arg.uplink_quantize, arg.uplink_compress)
+            if data is not None:
+                self._live(data)
+                if arg.uplink_rate:
+                    self.next = time.perf_counter() + 1 / arg.uplink_rate
+            if self.spool is not None and self.spool.pending() and time.perf_counter() >= self.drain_at:
+                self._drain()
+            if self.period and time.perf_counter() - self.since >= self.period:
+                print(self.report())
+
+    def _ready(self):
+        return bool(self.frames) and (len(self.frames) >= self.batch_size or time.perf_counter() >= self.batch_at)
+
+    def _timeout(self):
+        # seconds until the next report, the next batch of the spool or the next batch of messages
+        waits = [self.period] if self.period else []
+        if self.spool is not None and self.spool.pending():
+            waits.append(max(self.drain_at - time.perf_counter(), 0))
+        if self.frames:
+            waits.append(max(self.batch_at - time.perf_counter(), 0))
+        return min(waits) if waits else None
+
+    def _live(self, data):
+        # while the server is down the message waits in the spool, the drainer finds the server again
+        if self.down or not self._post(data):
+            self._spool(data)
+
+    def _spool(self, data):
+        if self.spool is None:
+            return
+        try:
+            self.spool.append(data)
+        except OSError as e:
+            print(f"# spool failed: {e}")
+            return
+        self.spooled = self.spooled + 1
+        if not self.down:
+            self.down = True
+            self.drain_at = time.perf_counter() + arg.spool_interval
+
+    def _drain(self):
+        messages = self.spool.peek(arg.spool_batch)
+        sent = 0
+        # a message rejected by the server is committed as well, it must not block the ones behind it
+        for data in messages:
+            if not self._post(data, retries=0):
+                break
+            sent = sent + 1
+        self.spool.commit(sent)
+        self.replayed = self.replayed + sent
+        if not messages or sent < len(messages):
+            self.down = sent < len(messages)
+            self.drain_at = time.perf_counter() + arg.spool_interval
+        else:
+            self.down = False
+            self.drain_at = time.perf_counter() + len(messages) / arg.spool_rate
+
+    # True if the message is done, sent or rejected by the server, False if it may be sent later
+    def _post(self, data, retries=None):
+        retries = arg.uplink_retries if retries is None else retries
+        backoff = arg.uplink_backoff
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                if isinstance(data, bytes):
+                    response = self.session.post(self.url, data=data, timeout=arg.uplink_timeout,
+                                                 headers={'content-type': 'application/octet-stream'})
+                else:
+                    response = self.session.get(self.url, json=data, timeout=arg.uplink_timeout)
+                # a 4xx answer rejects this message, sending it again would fail again and block the spool
+                if 400 <= response.status_code < 500:
+                    self.dropped = self.dropped + 1
+                    print(f"# uplink rejected: {response.status_code}, the message is dropped")
+                    return True
+                # a 5xx answer is a failed send, it is retried and spooled like a lost connection
+                response.raise_for_status()
+                self.latency.append(time.perf_counter() - start)
+                self.sent = self.sent + 1
+                return True
+            except requests.exceptions.RequestException as e:
+                error = e
+            # a newer message replaces this one instead of waiting behind the retries
+            if self.queue or attempt == retries:
+                break
+            time.sleep(backoff)
+            backoff = min(2 * backoff, arg.uplink_backoff_max)
+        self.failed = self.failed + 1
+        status = f" {error.response.status_code}" if error.response is not None else ''
+        print(f"# uplink failed: {type(error).__name__}{status}")
+        return False
+
+    '''
+        @ name      : report
+        @ desc      : counters since the last report
+    '''
+    def report(self):
+        latency = self.latency
+        mean = 1000 * sum(latency) / len(latency) if latency else 0
+        worst = 1000 * max(latency) if latency else 0
+        report = f"# uplink      : sent {self.sent}, dropped {self.dropped}, failed {self.failed}, " \
+                 f"latency mean {mean:.0f} ms, max {worst:.0f} ms"
+        if self.spool is not None:
+            report = report + f", spooled {self.spooled}, replayed {self.replayed}, backlog {self.spool.bytes} bytes"
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.latency = []
+        self.since = time.perf_counter()
+        return report
+
+
+_sender = None
+
+
+'''
+@ name      : sender
+@ desc      : the sender of the current process, created by the first call,
+              a StreamSender if arg.uplink is 'websocket', else a Sender
+'''
+def sender():
+    global _sender
+    if _sender is None or _sender.pid != os.getpid():
+        if arg.uplink == 'websocket':
+            import datav.stream as sm
+            _sender = sm.StreamSender()
+        else:
+            _sender = Sender()
+    return _sender
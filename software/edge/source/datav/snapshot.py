@@ -0,0 +1,103 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to dump the debug plots as arrays and to render them in a worker process
+@ author: Bohao Chu
+'''
+import os, sys
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.dirname(SCRIPT_DIR)
+ROOT_DIR = os.path.dirname(SOURCE_DIR)
+sys.path.append(SOURCE_DIR)
+import time
+import multiprocessing as mp
+import numpy as np
+import arguments as arg
+
+
+# kinds of snapshots and the directories of their images
+KINDS = {'data': f"{ROOT_DIR}/assets/images/data", 'feature': f"{ROOT_DIR}/assets/images/feature"}
+
+
+def _directory():
+    return arg.snapshot_dir or f"{ROOT_DIR}/assets/snapshots"
+
+
+'''
+@ name      : render
+@ desc      : draw one plot and save it as png, matplotlib is only imported by the first call,
+              so a process which never renders never loads it
+@ parameter : kind, 'data' for a line plot, 'feature' for an image
+              name, e.g. 'mic'
+              data, the array
+              stamp, time of the data, default now
+@ return    : path of the png
+'''
+def render(kind, name, data, stamp=None):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    stamp = time.time() if stamp is None else stamp
+    if kind == 'data':
+        plt.plot(range(len(data)), data)
+        path = f"{KINDS[kind]}/{name}-data-{len(data)}-{stamp}.png"
+    else:
+        plt.imshow(data, origin='lower', vmin=-3, vmax=7)
+        path = f"{KINDS[kind]}/{name}-feature-{stamp}.png"
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+'''
+@ name      : save
+@ desc      : dump one array for the Renderer, a np.save instead of a plot on the hot path.
+              the file gets its name after it is written, the renderer never reads half a file.
+@ parameter : kind, 'data' or 'feature'
+              name, e.g. 'mic'
+              data, the array
+@ return    : none
+'''
+def save(kind, name, data):
+    directory = _directory()
+    os.makedirs(directory, exist_ok=True)
+    path = f"{directory}/{kind}-{name}-{time.time()}"
+    with open(f"{path}.tmp", 'wb') as f:
+        np.save(f, np.asarray(data))
+    os.replace(f"{path}.tmp", f"{path}.npy")
+
+
+'''
+@ name      : Renderer
+@ desc      : low priority process which renders the snapshots dumped by save() to the png files
+              datasave and featuresave wrote before, and deletes them. it is the only process
+              which imports matplotlib.
+@ parameter : stop, event which ends the process, None runs until the program ends
+              interval, seconds between two looks into the snapshot directory, default arg.snapshot_interval
+@ return    :
+'''
+class Renderer(mp.Process):
+    def __init__(self, stop=None, interval=None):
+        super(Renderer, self).__init__()
+        self.stop = stop
+        self.interval = arg.snapshot_interval if interval is None else interval
+
+    def run(self):
+        print("# renderer process id : ", os.getpid())
+        os.nice(arg.snapshot_nice)
+        directory = _directory()
+        os.makedirs(directory, exist_ok=True)
+        try:
+            while self.stop is None or not self.stop.is_set():
+                for file in sorted(os.listdir(directory)):
+                    if not file.endswith('.npy'):
+                        continue
+                    kind, name, stamp = file[:-4].split('-', 2)
+                    try:
+                        render(kind, name, np.load(f"{directory}/{file}"), stamp)
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"# snapshot {file} is not rendered: {e}")
+                    os.remove(f"{directory}/{file}")
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to keep the data visualization messages on disk while the uplink is down
+@ author: Bohao Chu
+'''
+import os, sys
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.dirname(SCRIPT_DIR)
+ROOT_DIR = os.path.dirname(SOURCE_DIR)
+sys.path.append(SOURCE_DIR)
+import json
+import struct
+import arguments as arg
+
+
+# record: kind u8 (0 json, 1 binary payload of datav/codec.py), length u32, payload
+_RECORD = struct.Struct('<BI')
+JSON = 0
+BINARY = 1
+
+
+'''
+@ name      : Spool
+@ desc      : append-only store of the messages which could not be sent, in segment files
+              <directory>/<index>.seg of about segment bytes. the oldest segments are deleted
+              when the spool is larger than size, so the newest history is kept.
+              the messages are read oldest first by peek() and removed by commit(), a segment is
+              deleted when all of its messages are committed. the segments left on disk are
+              read again after a restart, the committed part of a partly sent segment is sent
+              again, a message is sent at least once. a record torn by a crash is cut off the
+              last segment when the spool is opened, a segment with a record which can not be
+              decoded is renamed to <index>.bad and skipped.
+@ parameter : directory, directory of the segments, default arg.spool_dir or edge/spool
+              segment, bytes of one segment, default arg.spool_segment
+              size, bytes of all segments, default arg.spool_size
+@ return    :
+'''
+class Spool:
+    def __init__(self, directory=None, segment=None, size=None):
+        self.directory = directory or arg.spool_dir or f"{ROOT_DIR}/spool"
+        self.segment = arg.spool_segment if segment is None else segment
+        self.size = arg.spool_size if size is None else size
+        os.makedirs(self.directory, exist_ok=True)
+        self.segments = sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith('.seg'))
+        if self.segments:
+            self._repair(self.segments[-1])
+        # index of the newest segment, quarantined ones included, a new segment never reuses an index
+        self.last = max([int(name[:-4]) for name in os.listdir(self.directory) if name.endswith('.bad')] + self.segments,
+                        default=-1)
+        self.bytes = sum(os.path.getsize(self._path(index)) for index in self.segments)
+        self.file = None
+        # read position in the oldest segment, and the record ends of the last peek
+        self.offset = 0
+        self.ends = []
+        self.evicted = 0
+        if self.segments:
+            print(f"# spool holds {len(self.segments)} segments, {self.bytes} bytes")
+
+    def _path(self, index):
+        return f"{self.directory}/{index:08d}.seg"
+
+    # cut a record torn by a crash off the end of a segment, the next append starts behind the last complete one
+    def _repair(self, index):
+        path = self._path(index)
+        size = os.path.getsize(path)
+        end = 0
+        with open(path, 'rb') as f:
+            while True:
+                head = f.read(_RECORD.size)
+                if len(head) < _RECORD.size:
+                    break
+                kind, length = _RECORD.unpack(head)
+                if kind not in (JSON, BINARY) or end + _RECORD.size + length > size:
+                    break
+                f.seek(length, os.SEEK_CUR)
+                end = end + _RECORD.size + length
+        if end < size:
+            os.truncate(path, end)
+            print(f"# spool segment {index} ends with a torn record, {size - end} bytes cut off")
+
+    def _roll(self):
+        if self.file is not None:
+            self.file.close()
+        self.last = self.last + 1
+        self.segments.append(self.last)
+        self.file = open(self._path(self.segments[-1]), 'ab')
+
+    def _written(self, index):
+        return self.file is not None and index == self.segments[-1]
+
+    '''
+        @ name      : pending
+        @ desc      : True if messages are left to send
+    '''
+    def pending(self):
+        return self.bytes > 0
+
+    '''
+        @ name      : append
+        @ desc      : store one message at the end of the spool
+        @ parameter : data, json message, or bytes of a binary payload
+        @ return    : none
+    '''
+    def append(self, data):
+        if isinstance(data, bytes):
+            kind, payload = BINARY, data
+        else:
+            kind, payload = JSON, json.dumps(data).encode('utf-8')
+        if self.file is None:
+            if self.segments and os.path.getsize(self._path(self.segments[-1])) < self.segment:
+                self.file = open(self._path(self.segments[-1]), 'ab')
+            else:
+                self._roll()
+        self.file.write(_RECORD.pack(kind, len(payload)) + payload)
+        # the record reaches the disk before the next one, a power loss tears at most one record
+        self.file.flush()
+        self.bytes = self.bytes + _RECORD.size + len(payload)
+        if self.file.tell() >= self.segment:
+            self._roll()
+        while self.bytes > self.size and len(self.segments) > 1:
+            self._evict()
+
+    def _evict(self):
+        index = self.segments.pop(0)
+        size = os.path.getsize(self._path(index))
+        os.remove(self._path(index))
+        # the committed part of the read segment is not counted anymore
+        self.bytes = self.bytes - (size - self.offset)
+        self.offset = 0
+        self.ends = []
+        self.evicted = self.evicted + 1
+        print(f"# spool is full, segment {index} with {size} bytes deleted")
+
+    '''
+        @ name      : peek
+        @ desc      : read the oldest messages without removing them
+        @ parameter : count, amount of messages at most
+        @ return    : [message], json messages as dict, binary payloads as bytes
+    '''
+    def peek(self, count):
+        self.ends = []
+        if not self.segments:
+            return []
+        # the segment which is written is read as well, its records are flushed and never change
+        messages = []
+        error = None
+        with open(self._path(self.segments[0]), 'rb') as f:
+            f.seek(self.offset)
+            while len(messages) < count:
+                head = f.read(_RECORD.size)
+                if len(head) < _RECORD.size:
+                    break
+                kind, length = _RECORD.unpack(head)
+                payload = f.read(length)
+                # a record torn by a power loss ends the segment
+                if len(payload) < length:
+                    break
+                try:
+                    if kind not in (JSON, BINARY):
+                        raise ValueError(f"unknown record kind {kind}")
+                    message = payload if kind == BINARY else json.loads(payload)
+                except ValueError as e:
+                    error = e
+                    break
+                messages.append(message)
+                self.ends.append(f.tell())
+        # the messages in front of a corrupt record are sent first, then its segment is put aside
+        if error is not None and not messages:
+            self._quarantine(error)
+            return self.peek(count)
+        # nothing left in a segment which is not written anymore, it is done
+        if not messages and not self._written(self.segments[0]):
+            self._done()
+        return messages
+
+    '''
+        @ name      : commit
+        @ desc      : remove the first messages of the last peek, they were sent
+        @ parameter : count, amount of messages
+        @ return    : none
+    '''
+    def commit(self, count):
+        if count == 0:
+            return
+        end = self.ends[count - 1]
+        self.bytes = self.bytes - (end - self.offset)
+        self.offset = end
+        self.ends = []
+        if self.offset >= os.path.getsize(self._path(self.segments[0])):
+            # a segment which is written is closed, the next append starts a new one
+            if self._written(self.segments[0]):
+                self.file.close()
+                self.file = None
+            self._done()
+
+    def _quarantine(self, error):
+        index = self.segments[0]
+        path = self._path(index)
+        if self._written(index):
+            self.file.close()
+            self.file = None
+        self.segments.pop(0)
+        self.bytes = self.bytes - (os.path.getsize(path) - self.offset)
+        os.replace(path, f"{path[:-4]}.bad")
+        self.offset = 0
+        print(f"# spool segment {index} is corrupt, kept as {index:08d}.bad: {error}")
+
+    def _done(self):
+        index = self.segments.pop(0)
+        path = self._path(index)
+        self.bytes = self.bytes - (os.path.getsize(path) - self.offset)
+        os.remove(path)
+        self.offset = 0
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to stream the data visualization messages over one websocket connection
+@ author: Bohao Chu
+'''
+import os, sys
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(SOURCE_DIR)
+import json
+import time
+import websocket
+import datav.sender as sd
+import arguments as arg
+
+
+'''
+@ name      : StreamSender
+@ desc      : Sender which pushes the messages over one websocket connection to the websocket
+              server of the dashboard, the tls and http handshakes are done once per connection
+              instead of once per message. json messages are sent as text frames, binary
+              payloads of datav/codec.py as binary frames.
+              a broken connection is opened again by the next message, the attempts are
+              spaced by the exponential backoff of the uplink.
+@ parameter : url, websocket url of the dashboard, default arg.ws_url
+              depth, amount of messages kept in the queue, default arg.uplink_depth
+              period, seconds between two reports, 0 disables the report, default arg.stats_period
+@ return    :
+'''
+class StreamSender(sd.Sender):
+    def __init__(self, url=None, depth=None, period=None):
+        super(StreamSender, self).__init__(arg.ws_url if url is None else url, depth, period)
+
+    def _open(self):
+        self.ws = None
+        self.backoff = arg.uplink_backoff
+        self.connects = 0
+
+    def _connect(self):
+        try:
+            self.ws = websocket.create_connection(self.url, timeout=arg.uplink_timeout, enable_multithread=False)
+        except (websocket.WebSocketException, OSError) as e:
+            print(f"# websocket connect failed: {type(e).__name__}, retry in {self.backoff}s")
+            time.sleep(self.backoff)
+            self.backoff = min(2 * self.backoff, arg.uplink_backoff_max)
+            return False
+        self.backoff = arg.uplink_backoff
+        self.connects = self.connects + 1
+        print(f"# websocket connected to {self.url}")
+        return True
+
+    def _close(self):
+        try:
+            self.ws.close()
+        except (websocket.WebSocketException, OSError):
+            pass
+        self.ws = None
+
+    def _post(self, data, retries=None):
+        # a message which fails on a kept connection is sent once more on a new one
+        for attempt in range(2):
+            if self.ws is None and not self._connect():
+                break
+            start = time.perf_counter()
+            try:
+                if isinstance(data, bytes):
+                    self.ws.send_binary(data)
+                else:
+                    self.ws.send(json.dumps(data))
+                self.latency.append(time.perf_counter() - start)
+                self.sent = self.sent + 1
+                return True
+            except (websocket.WebSocketException, OSError) as e:
+                print(f"# websocket closed: {type(e).__name__}")
+                self._close()
+        self.failed = self.failed + 1
+        return False
+
+    '''
+        @ name      : report
+        @ desc      : counters since the last report and the connections opened since the start
+    '''
+    def report(self):
+        return super(StreamSender, self).report() + f", connections {self.connects}"
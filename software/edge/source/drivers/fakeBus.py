@@ -0,0 +1,52 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is a fake SMBus of the MPU9250, the drivers can be checked without the pi
+@ author: Bohao Chu
+'''
+import numpy as np
+import drivers.mpuDriver as mpuD
+
+
+'''
+@ name      : FakeSMBus
+@ desc      : registers of the MPU9250 and its FIFO in memory. push() puts samples into the FIFO
+              the way the sensor does, the driver reads them back by its block reads.
+@ parameter : none
+@ return    :
+'''
+class FakeSMBus:
+    def __init__(self):
+        self.registers = {}
+        self.fifo = bytearray()
+
+    '''
+        @ name      : push
+        @ desc      : write raw samples into the FIFO, MSB first
+        @ parameter : samples, (n, values per frame) int16 raw values
+        @ return    : none
+    '''
+    def push(self, samples):
+        self.fifo.extend(np.asarray(samples, dtype='>i2').tobytes())
+
+    def write_byte_data(self, address, register, value):
+        self.registers[(address, register)] = value
+        if register == mpuD.USER_CTRL and value & mpuD.USER_FIFO_RST:
+            self.fifo = bytearray()
+
+    def read_byte_data(self, address, register):
+        if register == mpuD.WHO_AM_I:
+            return mpuD.DEVICE_ID
+        return self.registers.get((address, register), 0)
+
+    def read_i2c_block_data(self, address, register, length):
+        if register == mpuD.FIFO_COUNTH:
+            count = len(self.fifo)
+            return [(count >> 8) & 0x1F, count & 0xFF]
+        if register == mpuD.FIFO_R_W:
+            data = self.fifo[:length]
+            del self.fifo[:length]
+            return list(data)
+        if register == mpuD.AK8963_ASAX:
+            return [128] * length
+        return [0] * length
@@ -6,8 +6,8 @@ Copyright © 2021 DUE TUL
 @ desc  : This modules is used to read/write to MPU9250 sensor
 @ author: Bohao Chu
 '''
-import smbus  # import SMBus module of I2C
 import time  # import time function
+import numpy as np
 
 '''
 @ desc : some MPU9250 register and their address 
@@ -45,8 +45,20 @@ MOT_DETECT_CTRL = 0x69
 USER_CTRL = 0x6A
 PWR_MGMT_1 = 0x6B  # R107 Power Management 1
 PWR_MGMT_2 = 0x6C  # R108 Power Management 2
+FIFO_COUNTH = 0x72  # R114 FIFO Count High, [4:0] fifo_cnt[12:8]
+FIFO_COUNTL = 0x73  # R115 FIFO Count Low, [7:0] fifo_cnt[7:0]
 FIFO_R_W = 0x74
 
+''' 
+@ desc : FIFO configuration bits 
+'''
+FIFO_ACCEL = 0x08  # R35 write ACCEL_XOUT_H ... ACCEL_ZOUT_L to the FIFO
+FIFO_GYRO = 0x70  # R35 write GYRO_XOUT_H ... GYRO_ZOUT_L to the FIFO
+USER_FIFO_EN = 0x40  # R106 enable FIFO operation mode
+USER_FIFO_RST = 0x04  # R106 reset FIFO module
+FIFO_SIZE = 512  # FIFO size in bytes
+BLOCK_SIZE = 32  # max length of one SMBus block read
+
 ''' 
 @ desc : Gyro Full Scale Select 
 '''
@@ -84,19 +96,24 @@ AK8963_MODE_C100HZ = 0x06  # Continous data output 100Hz
 AK8963_BIT_14 = 0x00  # 14bit output
 AK8963_BIT_16 = 0x01  # 16bit output
 
-# smbus
-bus = smbus.SMBus(1)
-
 
 class MPU9250:
     '''
     @desc Constructor
     @param [1] self The object pointer
     @param [2] address MPU-9250 I2C slave address default:0x68
+    @param [3] i2c SMBus object, default: SMBus(1)
     '''
 
-    def __init__(self, address=SLAVE_ADDRESS):
+    def __init__(self, address=SLAVE_ADDRESS, i2c=None):
         self.address = address
+        # the bus can be replaced, e.g. by a fake SMBus for testing, smbus is only needed on the pi
+        if i2c is None:
+            import smbus
+            i2c = smbus.SMBus(1)
+        self.bus = i2c
+        self.fifo_frame = 0
+        self.fifo_overflow = 0
         self.configMPU9250(GFS_250, AFS_2G)
         time.sleep(1)
         self.configAK8963(AK8963_MODE_C100HZ, AK8963_BIT_16)
@@ -113,7 +130,7 @@ class MPU9250:
     '''
 
     def searchDevice(self):
-        who_am_i = bus.read_byte_data(self.address, WHO_AM_I)
+        who_am_i = self.bus.read_byte_data(self.address, WHO_AM_I)
         if (who_am_i == DEVICE_ID):
             return True
         else:
@@ -146,31 +163,31 @@ class MPU9250:
             self.ares = 16.0 / 32768.0
 
         # sleep off
-        bus.write_byte_data(self.address, PWR_MGMT_1, 0x00)
+        self.bus.write_byte_data(self.address, PWR_MGMT_1, 0x00)
         time.sleep(0.1)
         # auto select clock source
-        bus.write_byte_data(self.address, PWR_MGMT_1, 0x01)
+        self.bus.write_byte_data(self.address, PWR_MGMT_1, 0x01)
         time.sleep(0.1)
         # sample rate divider - [7:0]SMPLRT_DIV
-        bus.write_byte_data(self.address, SMPLRT_DIV, 0x00)
+        self.bus.write_byte_data(self.address, SMPLRT_DIV, 0x00)
         time.sleep(0.1)
         # DLPF_CFG - [6]FIFO_MODE [5:3]EXT_SYNC_SET [2:0]DLPF_CFG
-        bus.write_byte_data(self.address, CONFIG, 0x07)
+        self.bus.write_byte_data(self.address, CONFIG, 0x07)
         time.sleep(0.1)
         # open acc and gyro
-        bus.write_byte_data(self.address, PWR_MGMT_2, 0x00)
+        self.bus.write_byte_data(self.address, PWR_MGMT_2, 0x00)
         time.sleep(0.1)
         # gyro full scale select
-        bus.write_byte_data(self.address, GYRO_CONFIG, gfs << 3)
+        self.bus.write_byte_data(self.address, GYRO_CONFIG, gfs << 3)
         time.sleep(0.1)
         # accel full scale select
-        bus.write_byte_data(self.address, ACCEL_CONFIG, afs << 3)
+        self.bus.write_byte_data(self.address, ACCEL_CONFIG, afs << 3)
         time.sleep(0.1)
         # A_DLPFCFG - [3]accel_fchoice_b [2:0]A_DLPFCFG
-        bus.write_byte_data(self.address, ACCEL_CONFIG_2, 0x00)
+        self.bus.write_byte_data(self.address, ACCEL_CONFIG_2, 0x00)
         time.sleep(0.1)
         # BYPASS_EN
-        bus.write_byte_data(self.address, INT_PIN_CFG, 0x02)
+        self.bus.write_byte_data(self.address, INT_PIN_CFG, 0x02)
         time.sleep(0.1)
 
     '''
@@ -186,23 +203,23 @@ class MPU9250:
         else:  # mfs == AK8963_BIT_16:
             self.mres = 4912.0 / 32760.0
 
-        bus.write_byte_data(AK8963_SLAVE_ADDRESS, AK8963_CNTL1, 0x00)
+        self.bus.write_byte_data(AK8963_SLAVE_ADDRESS, AK8963_CNTL1, 0x00)
         time.sleep(0.01)
         # set read FuseROM mode
-        bus.write_byte_data(AK8963_SLAVE_ADDRESS, AK8963_CNTL1, 0x0F)
+        self.bus.write_byte_data(AK8963_SLAVE_ADDRESS, AK8963_CNTL1, 0x0F)
         time.sleep(0.01)
         # read coef data
-        data = bus.read_i2c_block_data(AK8963_SLAVE_ADDRESS, AK8963_ASAX, 3)
+        data = self.bus.read_i2c_block_data(AK8963_SLAVE_ADDRESS, AK8963_ASAX, 3)
 
         self.magXcoef = (data[0] - 128) / 256.0 + 1.0
         self.magYcoef = (data[1] - 128) / 256.0 + 1.0
         self.magZcoef = (data[2] - 128) / 256.0 + 1.0
 
         # set power down mode
-        bus.write_byte_data(AK8963_SLAVE_ADDRESS, AK8963_CNTL1, 0x00)
+        self.bus.write_byte_data(AK8963_SLAVE_ADDRESS, AK8963_CNTL1, 0x00)
         time.sleep(0.01)
         # set scale&continous mode
-        bus.write_byte_data(AK8963_SLAVE_ADDRESS, AK8963_CNTL1, (mfs << 4 | mode))
+        self.bus.write_byte_data(AK8963_SLAVE_ADDRESS, AK8963_CNTL1, (mfs << 4 | mode))
         time.sleep(0.01)
         print("MPU9250 : Magnetometer configuration complete. ")
 
@@ -214,7 +231,7 @@ class MPU9250:
     '''
 
     def checkDataReady(self):
-        drdy = bus.read_byte_data(self.address, INT_STATUS)
+        drdy = self.bus.read_byte_data(self.address, INT_STATUS)
         if drdy & 0x01:
             return True
         else:
@@ -229,7 +246,7 @@ class MPU9250:
     '''
 
     def readAccel(self):
-        data = bus.read_i2c_block_data(self.address, ACCEL_OUT, 6)
+        data = self.bus.read_i2c_block_data(self.address, ACCEL_OUT, 6)
         x = self.dataConv(data[1], data[0])
         y = self.dataConv(data[3], data[2])
         z = self.dataConv(data[5], data[4])
@@ -261,7 +278,7 @@ class MPU9250:
     '''
 
     def readGyro(self):
-        data = bus.read_i2c_block_data(self.address, GYRO_OUT, 6)
+        data = self.bus.read_i2c_block_data(self.address, GYRO_OUT, 6)
         x = self.dataConv(data[1], data[0])
         y = self.dataConv(data[3], data[2])
         z = self.dataConv(data[5], data[4])
@@ -287,6 +304,127 @@ class MPU9250:
         return {"x": data_x, "y": data_y, "z": data_z}
 
 
+    '''
+    @desc Configure FIFO streaming
+    @param [1] self The object pointer.
+    @param [2] rate Sample rate in Hz, 1000 / (1 + SMPLRT_DIV), 4 ~ 1000
+    @param [3] accel Write accelerometer data to the FIFO
+    @param [4] gyro Write gyroscope data to the FIFO
+    @retval rate the real sample rate of the FIFO
+    '''
+
+    def configFIFO(self, rate=1000, accel=True, gyro=False):
+        if not (accel or gyro):
+            raise ValueError("FIFO needs accel or gyro enabled")
+        divider = min(max(int(round(1000.0 / rate)) - 1, 0), 255)
+        self.fifo_rate = 1000.0 / (1 + divider)
+        self.fifo_accel = accel
+        self.fifo_gyro = gyro
+        # 3 axes * 16bit for each sensor
+        self.fifo_frame = 6 * (int(accel) + int(gyro))
+        # the largest block read which only holds whole frames
+        self.fifo_block = BLOCK_SIZE - BLOCK_SIZE % self.fifo_frame
+
+        # stop FIFO
+        self.bus.write_byte_data(self.address, FIFO_EN, 0x00)
+        time.sleep(0.01)
+        # FIFO_MODE=1 keeps the FIFO frame aligned when it is full, DLPF_CFG=1 makes SMPLRT_DIV valid
+        self.bus.write_byte_data(self.address, CONFIG, 0x41)
+        time.sleep(0.01)
+        # sample rate divider - [7:0]SMPLRT_DIV
+        self.bus.write_byte_data(self.address, SMPLRT_DIV, divider)
+        time.sleep(0.01)
+        self.resetFIFO()
+        print(f"MPU9250 : FIFO configuration complete, {self.fifo_rate}Hz. ")
+        return self.fifo_rate
+
+    '''
+    @desc Reset and enable FIFO
+    @param [1] self The object pointer.
+    '''
+
+    def resetFIFO(self):
+        self.bus.write_byte_data(self.address, FIFO_EN, 0x00)
+        self.bus.write_byte_data(self.address, USER_CTRL, USER_FIFO_RST)
+        time.sleep(0.001)
+        self.bus.write_byte_data(self.address, USER_CTRL, USER_FIFO_EN)
+        self.bus.write_byte_data(self.address, FIFO_EN,
+                                 (FIFO_ACCEL if self.fifo_accel else 0) | (FIFO_GYRO if self.fifo_gyro else 0))
+
+    '''
+    @desc Stop FIFO streaming
+    @param [1] self The object pointer.
+    '''
+
+    def stopFIFO(self):
+        self.bus.write_byte_data(self.address, FIFO_EN, 0x00)
+        self.bus.write_byte_data(self.address, USER_CTRL, 0x00)
+        # back to the default configuration of configMPU9250
+        self.bus.write_byte_data(self.address, CONFIG, 0x07)
+        self.bus.write_byte_data(self.address, SMPLRT_DIV, 0x00)
+        self.fifo_frame = 0
+
+    '''
+    @desc Read all samples in FIFO by block reads
+    @param [1] self The object pointer.
+    @retval acc : (n, 3) float32 accelerometer data, if accel is in FIFO
+    @retval overflow : True if the FIFO was full and reset, the samples before this read are lost
+    '''
+
+    def readFIFO(self):
+        data = self.bus.read_i2c_block_data(self.address, FIFO_COUNTH, 2)
+        count = ((data[0] & 0x1F) << 8) | data[1]
+        result = {'overflow': False}
+        if count + self.fifo_frame > FIFO_SIZE:
+            # FIFO is full and samples are lost, so restart it and tell the caller about the gap
+            self.fifo_overflow = self.fifo_overflow + 1
+            self.resetFIFO()
+            result['overflow'] = True
+            count = 0
+        count = count - count % self.fifo_frame
+
+        raw = bytearray()
+        while count > 0:
+            length = min(self.fifo_block, count)
+            raw.extend(self.bus.read_i2c_block_data(self.address, FIFO_R_W, length))
+            count = count - length
+        # MSB first, accel is written before gyro
+        frames = np.frombuffer(bytes(raw), dtype='>i2').reshape(-1, self.fifo_frame // 2)
+
+        column = 0
+        if self.fifo_accel:
+            result['acc'] = (frames[:, 0:3] * self.ares).astype(np.float32)
+            column = 3
+        if self.fifo_gyro:
+            result['gyr'] = (frames[:, column:column + 3] * self.gres).astype(np.float32)
+        # 1K*6byte = 200 block reads/s instead of 1000 single reads/s
+        return result
+
+    '''
+    @desc Sample a fixed amount of data from FIFO
+    @param [1] self The object pointer.
+    @param [2] amount Amount of samples
+    @retval acc : (amount, 3) float32 accelerometer data, if accel is in FIFO
+    @retval gyr : (amount, 3) float32 gyroscope data, if gyro is in FIFO
+    @retval overflow : amount of FIFO overflows while sampling, the data has a gap if it is not 0
+    '''
+
+    def fifo_sample(self, amount=500):
+        blocks = {}
+        total = 0
+        overflow = 0
+        while total < amount:
+            # about a quarter of the FIFO is filled between two reads
+            time.sleep(FIFO_SIZE / 4 / self.fifo_frame / self.fifo_rate)
+            data = self.readFIFO()
+            overflow = overflow + int(data.pop('overflow'))
+            for key in data:
+                blocks.setdefault(key, []).append(data[key])
+            total = total + len(next(iter(data.values())))
+        result = {key: np.concatenate(blocks[key])[:amount] for key in blocks}
+        result['overflow'] = overflow
+        return result
+
     '''
     @desc Read magneto
     @param [in] self The object pointer.
@@ -300,9 +438,9 @@ class MPU9250:
         y = 0
         z = 0
         # check data ready
-        drdy = bus.read_byte_data(AK8963_SLAVE_ADDRESS, AK8963_ST1)
+        drdy = self.bus.read_byte_data(AK8963_SLAVE_ADDRESS, AK8963_ST1)
         if drdy & 0x01:
-            data = bus.read_i2c_block_data(AK8963_SLAVE_ADDRESS, AK8963_MAGNET_OUT, 7)
+            data = self.bus.read_i2c_block_data(AK8963_SLAVE_ADDRESS, AK8963_MAGNET_OUT, 7)
 
             # check overflow
             if (data[6] & 0x08) != 0x08:
@@ -329,7 +467,7 @@ class MPU9250:
     '''
 
     def readTemperature(self):
-        data = bus.read_i2c_block_data(self.address, TEMP_OUT, 2)
+        data = self.bus.read_i2c_block_data(self.address, TEMP_OUT, 2)
         temp = self.dataConv(data[1], data[0])
 
         temp = round((temp / 333.87 + 21.0), 3)
@@ -350,7 +488,39 @@ class MPU9250:
         return value
 
 
+'''
+@desc Check the FIFO parsing on a fake SMBus, python3 drivers/mpuDriver.py --fake
+'''
+
+def checkFIFO():
+    import drivers.fakeBus as fb
+    bus = fb.FakeSMBus()
+    mpu = MPU9250(i2c=bus)
+    try:
+        mpu.configFIFO(1000, accel=False, gyro=False)
+        raise AssertionError("a FIFO without sensors is accepted")
+    except ValueError:
+        pass
+    mpu.configFIFO(1000, accel=True, gyro=True)
+    raw = np.random.randint(-32768, 32767, (40, 6))
+    bus.push(raw)
+    data = mpu.readFIFO()
+    assert not data['overflow']
+    assert np.allclose(data['acc'], (raw[:, 0:3] * mpu.ares).astype(np.float32))
+    assert np.allclose(data['gyr'], (raw[:, 3:6] * mpu.gres).astype(np.float32))
+    # a full FIFO is reset and reported
+    bus.push(np.zeros((FIFO_SIZE // 12 + 1, 6)))
+    data = mpu.readFIFO()
+    assert data['overflow'] and len(data['acc']) == 0 and mpu.fifo_overflow == 1
+    print(f"# fifo check passed, {len(raw)} frames parsed, overflow reported")
+
+
 if __name__ == "__main__":
+    import os, sys
+    if '--fake' in sys.argv:
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        checkFIFO()
+        sys.exit()
     mpu = MPU9250()
     while True:
         print(mpu.readAccel(), mpu.readGyro(), mpu.readMagnet())
@@ -19,10 +19,15 @@ import multiprocessing as mp
 import scipy.signal
 import requests
 import arguments as arg
-import tflite_runtime.interpreter as tflite
-from sklearn import preprocessing
 import datav.datav as dv
+import buffer.buffer as rb
 import feature.feature as fea
+import model.pool as pl
+import model.registry as rg
+import model.runner as rn
+import stage.stage as st
+import channel.channel as ch
+import queue
 
 
 # tensorflow default float32, numpy default float64
@@ -33,19 +38,18 @@ import feature.feature as fea
 @ return    :
 '''
 class DataProcess(mp.Process):
-    def __init__(self, queue_mic, queue_acc):
+    def __init__(self, queue_mic, queue_acc, stop):
         super(DataProcess, self).__init__()
         self.mpu = mpuD.MPU9250()
         self.mic, self.audio = micD.INMP441()
         self.laser = laserD.VL53L1()
         self.queue_mic = queue_mic
         self.queue_acc = queue_acc
+        self.stop = stop
 
         # raw data placeholder
-        self.mic_todo = [1 for i in range(7500)]
-        self.acc_x_todo = [1 for i in range(500)]
-        self.acc_y_todo = [1 for i in range(500)]
-        self.acc_z_todo = [1 for i in range(500)]
+        self.mic_todo = rb.RingBuffer(7500, fill=1)
+        self.acc_todo = rb.RingBuffer(500, channels=3, fill=1)
         self.laser_todo = 0
 
     '''
@@ -59,7 +63,7 @@ class DataProcess(mp.Process):
         while self.mic.is_active():
             stream_data = self.mic.read(arg.chunk, exception_on_overflow=False)
             mic_data = np.frombuffer(stream_data, dtype=np.int16)
-            self.mic_todo = mic_data
+            self.mic_todo.write(mic_data)
 
     '''
         @ name      : mpu_acc_raw
@@ -70,15 +74,14 @@ class DataProcess(mp.Process):
     def mpu_acc_raw(self):
         time.sleep(2)
         print(f"# mpu acc is sampling")
+        self.mpu.configFIFO(arg.acc_rate)
         while True:
-            acc = self.mpu.readAccel()
-            del self.acc_x_todo[0]
-            del self.acc_y_todo[0]
-            del self.acc_z_todo[0]
-            self.acc_x_todo.append(acc['x'])
-            self.acc_y_todo.append(acc['y'])
-            self.acc_z_todo.append(acc['z'])
-            time.sleep(0.0006)
+            # burst read the hardware FIFO, the sample rate is fixed by the sensor
+            data = self.mpu.readFIFO()
+            if data['overflow']:
+                print(f"# mpu fifo overflow {self.mpu.fifo_overflow}, the acc samples have a gap")
+            self.acc_todo.write(data['acc'])
+            time.sleep(arg.fifo_interval)
 
 
     '''
@@ -118,6 +121,7 @@ class DataProcess(mp.Process):
         self.laser.stop_ranging()
 
     def run(self):
+        st.ignore_interrupt()
         try:
             print("# data process id : ", os.getpid())
             threads = []
@@ -128,178 +132,210 @@ class DataProcess(mp.Process):
             t4 = threading.Thread(target=self.laser_raw)
             threads.append(t4)
             for t in threads:
+                # the sampling threads end with the process
+                t.daemon = True
                 t.start()
-            while True:
-                if not self.queue_mic.full():
-                    data = {'mic': self.mic_todo}
-                    self.queue_mic.put(data)
-                if not self.queue_acc.full():
-                    data = {'acc_x': self.acc_x_todo,
-                            'acc_y': self.acc_y_todo,
-                            'acc_z': self.acc_z_todo,
-                            'laser': self.laser_todo}
-                    self.queue_acc.put(data)
-                time.sleep(0.5)
-        except KeyboardInterrupt:
-            print('# DATAP: Is KeyboardInterrupt')
+            stats = st.StageStats('data', arg.stats_period)
+            # sequence number of the window, the model process pairs the mic and acc features by it
+            seq = 0
+            counts = None
+            while not self.stop.is_set():
+                stats.idle()
+                self.stop.wait(arg.publish_interval)
+                # a window is only published if new samples have arrived since the last one
+                if counts == (self.mic_todo.count, self.acc_todo.count):
+                    stats.skip('duplicate')
+                    continue
+                counts = (self.mic_todo.count, self.acc_todo.count)
+                stats.busy()
+                seq = seq + 1
+                data = {'mic': self.mic_todo.copy()}
+                self.queue_mic.put((seq, data))
+                acc = self.acc_todo.copy()
+                data = {'acc_x': acc[0],
+                        'acc_y': acc[1],
+                        'acc_z': acc[2],
+                        'laser': self.laser_todo}
+                self.queue_acc.put((seq, data))
+        finally:
+            print('# DATAP: Is stopped')
             self.mic.stop_stream()
             self.mic.close()
             self.audio.terminate()
             self.laser.stop_ranging()
-            sys.exit()
+            self.queue_mic.cancel_join_thread()
+            self.queue_acc.cancel_join_thread()
 
 
 class MicFeatureProcess(mp.Process):
-    def __init__(self, queue_in, queue_out):
+    def __init__(self, queue_in, queue_out, stop):
         super(MicFeatureProcess, self).__init__()
         self.queue_in = queue_in
         self.queue_out = queue_out
+        self.stop = stop
 
     def run(self):
+        st.ignore_interrupt()
         print("# mic feature process id : ", os.getpid())
-        scaler = preprocessing.StandardScaler()
-        i = 0
-        mic_tmp = []
-        while True:
-            if not self.queue_in.empty():
-                result = self.queue_in.get()
-                mic_feature = fea.micfeature(result['mic'])
-                self.queue_out.put(mic_feature)
-                fea._datav('mic', mic_feature)
+        stats = st.StageStats('mic feature', arg.stats_period, {'mic': self.queue_in})
+        while not self.stop.is_set():
+            stats.idle()
+            try:
+                seq, result = self.queue_in.get(timeout=arg.stage_timeout)
+            except queue.Empty:
+                continue
+            stats.busy()
+            mic_feature = fea.micfeature(result['mic'])
+            self.queue_out.put((seq, mic_feature))
+        self.queue_out.cancel_join_thread()
 
 
 
 class AccFeatureProcess(mp.Process):
-    def __init__(self, queue_in, queue_out):
+    def __init__(self, queue_in, queue_out, stop):
         super(AccFeatureProcess, self).__init__()
         self.queue_in = queue_in
         self.queue_out = queue_out
+        self.stop = stop
 
     def run(self):
+        st.ignore_interrupt()
         print("# acc feature process id : ", os.getpid())
-        i = 0
-        acc_tmp = []
-        while True:
-            if not self.queue_in.empty():
-                result = self.queue_in.get()
-                acc_x_feature, acc_y_feature, acc_z_feature = fea.accfreature(result['acc_x'], result['acc_y'], result['acc_z'])
-                laser_feature = [result['laser'] for i in range(128)]
-                data = {'acc_x': acc_x_feature,
-                        'acc_y': acc_y_feature,
-                        'acc_z': acc_z_feature,
-                        'laser': laser_feature}
-                self.queue_out.put(data)
-                # print("acc_stft:", result['acc_x'][:10], time.time() - start)
+        stats = st.StageStats('acc feature', arg.stats_period, {'acc': self.queue_in})
+        while not self.stop.is_set():
+            stats.idle()
+            try:
+                seq, result = self.queue_in.get(timeout=arg.stage_timeout)
+            except queue.Empty:
+                continue
+            stats.busy()
+            acc_x_feature, acc_y_feature, acc_z_feature = fea.accfeature(np.stack((result['acc_x'], result['acc_y'], result['acc_z'])))
+            laser_feature = np.full((60, 1), result['laser'], dtype=np.float32)
+            data = {'acc_x': acc_x_feature,
+                    'acc_y': acc_y_feature,
+                    'acc_z': acc_z_feature,
+                    'laser': laser_feature}
+            self.queue_out.put((seq, data))
+            # print("acc_stft:", result['acc_x'][:10], time.time() - start)
+        self.queue_out.cancel_join_thread()
 
 
 class RecoModelProcess(mp.Process):
-    def __init__(self, queue_mic_fea, queue_acc_fea):
+    def __init__(self, queue_mic_fea, queue_acc_fea, stop):
         super(RecoModelProcess, self).__init__()
         self.queue_mic_fea = queue_mic_fea
         self.queue_acc_fea = queue_acc_fea
+        self.stop = stop
 
-        # feature placeholder
-        self.mic_feature = np.random.random((128, 35))
-        self.acc_x_feature = np.random.random((128, 7))
-        self.acc_y_feature = np.random.random((128, 7))
-        self.acc_z_feature = np.random.random((128, 7))
-        self.laser_feature = np.random.random((128, 1))
+        # latest features, None until the first window has arrived
+        self.mic_feature = None
+        self.acc_x_feature = None
+        self.acc_y_feature = None
+        self.acc_z_feature = None
+        self.laser_feature = None
 
 
     def run(self):
+        st.ignore_interrupt()
         print("# model process id : ", os.getpid())
-        spin_interpreter = tflite.Interpreter(model_path=f"{ROOT_DIR}/models/seat/bohr_spin.tflite")
-        spin_interpreter.allocate_tensors()
-        up_interpreter = tflite.Interpreter(model_path=f"{ROOT_DIR}/models/seat/bohr_up.tflite")
-        up_interpreter.allocate_tensors()
-        down_interpreter = tflite.Interpreter(model_path=f"{ROOT_DIR}/models/seat/bohr_down.tflite")
-        down_interpreter.allocate_tensors()
-        '''
-        print(spin_interpreter.get_output_details())
-        print(up_interpreter.get_output_details())
-        print(down_interpreter.get_output_details())
-        '''
-
-        input_details = spin_interpreter.get_input_details()
-        input_index = input_details[0]['index']
-        # 0: 96, 1: 58, 2:68, 3:78, 4:88, 5:93
-
-        while True:
+        stats = st.StageStats('model', arg.stats_period, {'mic': self.queue_mic_fea, 'acc': self.queue_acc_fea})
+        # spin, up and down are the heads of one fused model, one invoke per window
+        # the features are written in place into its input tensor (1, 60, 91, 1), the layout of model.COLUMNS
+        # models/seat/fused.tflite is reloaded by the registry when its file changes
+        registry = rg.ModelRegistry(pl.InterpreterPool())
+        seat = registry.get('seat', 'fused')
+        seat_model = rn.ModelRunner(registry.pool, seat.key)
+        # sequence number of the latest mic feature
+        mic_seq = 0
+
+        while not self.stop.is_set():
             pred_resutl = []
-            if not self.queue_mic_fea.empty():
-                result = self.queue_mic_fea.get()
-                self.mic_feature = result
-            if not self.queue_acc_fea.empty():
-                result = self.queue_acc_fea.get()
-                self.acc_x_feature = result['acc_x']
-                self.acc_y_feature = result['acc_y']
-                self.acc_z_feature = result['acc_z']
-                self.laser_feature = result['laser']
-
-                merge_feature = np.column_stack((self.mic_feature,
-                                                 self.acc_x_feature,
-                                                 self.acc_y_feature,
-                                                 self.acc_z_feature,
-                                                 self.laser_feature)).astype(dtype=np.float32).reshape(1, 128, 57, 1)
-
-                spin_interpreter.set_tensor(input_index, merge_feature)
-                spin_interpreter.invoke()
-                spin_output = spin_interpreter.get_tensor(96)
-                up_interpreter.set_tensor(input_index, merge_feature)
-                up_interpreter.invoke()
-                up_output = up_interpreter.get_tensor(93)
-
-                down_interpreter.set_tensor(input_index, merge_feature)
-                down_interpreter.invoke()
-                down_output = down_interpreter.get_tensor(93)
-                if spin_output > 0.5 or up_output > 0.5 or down_output > 0.5:
-                    pred_resutl.append('on')
-                    print(f"on     : Y")
-                    print(f"off    : N")
-                else:
-                    pred_resutl.append('off')
-                    print(f"on     : N")
-                    print(f"off    : Y")
+            stats.idle()
+            # a new acc feature triggers the inference, wait for it without spinning
+            try:
+                acc_seq, result = self.queue_acc_fea.get(timeout=arg.stage_timeout)
+            except queue.Empty:
+                continue
+            # the mic feature of the same window may arrive a bit later
+            while mic_seq < acc_seq:
+                try:
+                    mic_seq, self.mic_feature = self.queue_mic_fea.get(timeout=arg.stage_timeout)
+                except queue.Empty:
+                    break
+            # inference runs once per synchronized (mic, acc) window
+            if mic_seq != acc_seq:
+                stats.skip('unpaired')
+                continue
+            stats.busy()
+            if registry.poll():
+                seat_model = rn.ModelRunner(registry.pool, seat.key)
+            seat_model.write(0, 'mic', self.mic_feature)
+            self.acc_x_feature = result['acc_x']
+            self.acc_y_feature = result['acc_y']
+            self.acc_z_feature = result['acc_z']
+            self.laser_feature = result['laser']
+            seat_model.write(0, 'acc_x', self.acc_x_feature)
+            seat_model.write(0, 'acc_y', self.acc_y_feature)
+            seat_model.write(0, 'acc_z', self.acc_z_feature)
+            seat_model.write(0, 'laser', np.reshape(self.laser_feature, (-1, 1)))
+
+            # the heads are the named outputs of the signature, e.g. spin, up and down
+            output = {name: float(value.reshape(-1)[0]) for name, value in seat_model.invoke().items()}
+            spin_output = output['spin']
+            up_output = output['up']
+            down_output = output['down']
+            if spin_output > 0.5 or up_output > 0.5 or down_output > 0.5:
+                pred_resutl.append('on')
+                print(f"on     : Y")
+                print(f"off    : N")
+            else:
+                pred_resutl.append('off')
+                print(f"on     : N")
+                print(f"off    : Y")
 
-                if spin_output > 0.5:
-                    pred_resutl.append('spin')
-                    print(f"spin   : Y")
-                else:
-                    print(f"spin   : N")
+            if spin_output > 0.5:
+                pred_resutl.append('spin')
+                print(f"spin   : Y")
+            else:
+                print(f"spin   : N")
 
 
-                if up_output > 0.5:
-                    pred_resutl.append('up')
-                    print(f"up     : Y")
-                else:
-                    print(f"up     : N")
+            if up_output > 0.5:
+                pred_resutl.append('up')
+                print(f"up     : Y")
+            else:
+                print(f"up     : N")
 
-                if down_output > 0.5:
-                    pred_resutl.append('down')
-                    print(f"down   : Y")
-                else:
-                    print(f"down   : N")
-                # 0.18s
-                dv.featurev(self.mic_feature, self.acc_x_feature, self.acc_y_feature, self.acc_z_feature,self.laser_feature, pred_resutl)
+            if down_output > 0.5:
+                pred_resutl.append('down')
+                print(f"down   : Y")
+            else:
+                print(f"down   : N")
+            # 0.18s
+            dv.featurev(self.mic_feature, self.acc_x_feature, self.acc_y_feature, self.acc_z_feature,self.laser_feature, pred_resutl)
 
 if __name__ == "__main__":
+    print("main process id:", os.getpid())
+    # latest wins between the stages, stale windows are dropped and counted
+    queue_mic_raw = ch.Mailbox(arg.mailbox_depth)
+    queue_acc_raw = ch.Mailbox(arg.mailbox_depth)
+    queue_mic_fea = ch.Mailbox(arg.mailbox_depth)
+    queue_acc_fea = ch.Mailbox(arg.mailbox_depth)
+    stop = mp.Event()
+    d = DataProcess(queue_mic_raw, queue_acc_raw, stop)
+    m = MicFeatureProcess(queue_mic_raw, queue_mic_fea, stop)
+    a = AccFeatureProcess(queue_acc_raw, queue_acc_fea, stop)
+    r = RecoModelProcess(queue_mic_fea, queue_acc_fea, stop)
+    processes = [d, m, a, r]
+    for p in processes:
+        p.start()
+    time.sleep(3)
+    print("\n# please type ctrl+c to stop program")
     try:
-        print("main process id:", os.getpid())
-        queue_mic_raw = mp.Queue()
-        queue_acc_raw = mp.Queue()
-        queue_mic_fea = mp.Queue()
-        queue_acc_fea = mp.Queue()
-        d = DataProcess(queue_mic_raw, queue_acc_raw)
-        m = MicFeatureProcess(queue_mic_raw, queue_mic_fea)
-        a = AccFeatureProcess(queue_acc_raw, queue_acc_fea)
-        r = RecoModelProcess(queue_mic_fea, queue_acc_fea)
-        d.start()
-        m.start()
-        a.start()
-        r.start()
-    finally:
-        time.sleep(3)
-        print("\n# please type ctrl+c to stop program")
-
-
-
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        # the stages leave their loops within stage_timeout
+        stop.set()
+        for p in processes:
+            p.join()
@@ -4,9 +4,10 @@ SOURCE_DIR = os.path.dirname(SCRIPT_DIR)
 ROOT_DIR = os.path.dirname(SOURCE_DIR)
 sys.path.append(SOURCE_DIR)
 sys.path.append(ROOT_DIR)
-import scipy.signal
-from sklearn import preprocessing
-import matplotlib.pyplot as plt
+import feature.stft as stft
+import feature.scale as scale
+import datav.snapshot as sn
+import arguments as arg
 import numpy as np
 
 
@@ -16,24 +17,74 @@ def normalization(data):
     return (data - np.min(data)) / _range
 
 def featuresave(name, data):
-    plt.imshow(data, origin='lower', vmin=-3, vmax=7)
-    plt.savefig(f"{ROOT_DIR}/assets/images/feature/{name}-feature-{time.time()}.png")
-    plt.close()
+    # a snapshot for the Renderer process, or the image at once
+    if arg.snapshot:
+        sn.save('feature', name, data)
+    else:
+        sn.render('feature', name, data)
+
+
+# stft plans, created once per process
+mic_stft = stft.STFT(nperseg=128, noverlap=16, fs=15000)
+acc_stft = stft.STFT(nperseg=128, noverlap=80, fs=1000)
 
 
 def micfeature(mic_data):
-    scaler = preprocessing.StandardScaler()
-    _, _, ps = scipy.signal.stft(mic_data, fs=15000, nperseg=128, noverlap=16, boundary=None, padded=False)  # 65,66
-    mic_feature = scaler.fit_transform(abs(ps[5:]))  # 60, 66
+    ps = mic_stft.magnitude(mic_data)  # 65,66
+    mic_feature = scale.standardize(ps[5:])  # 60, 66
     return mic_feature
 
 
 def accfreature(acc_x_data, acc_y_data, acc_z_data):
-    scaler = preprocessing.StandardScaler()
-    _, _, ps = scipy.signal.stft(acc_x_data, fs=1000, nperseg=128, noverlap=80, boundary=None, padded=False)  # 65, 8
-    acc_x_feature = scaler.fit_transform(abs(ps[5:]))  # 60, 8
-    _, _, ps = scipy.signal.stft(acc_y_data, fs=1000, nperseg=128, noverlap=80, boundary=None, padded=False)
-    acc_y_feature = scaler.fit_transform(abs(ps[5:]))
-    _, _, ps = scipy.signal.stft(acc_z_data, fs=1000, nperseg=128, noverlap=80, boundary=None, padded=False)
-    acc_z_feature = scaler.fit_transform(abs(ps[5:]))
+    ps = acc_stft.magnitude(acc_x_data)  # 65, 8
+    acc_x_feature = scale.standardize(ps[5:])  # 60, 8
+    ps = acc_stft.magnitude(acc_y_data)
+    acc_y_feature = scale.standardize(ps[5:])
+    ps = acc_stft.magnitude(acc_z_data)
+    acc_z_feature = scale.standardize(ps[5:])
     return acc_x_feature, acc_y_feature, acc_z_feature
+
+
+'''
+@ name      : accfeature
+@ desc      : batched acc feature, the three spectrograms and their column standardization in one pass
+@ parameter : acc_data, (3, 500) acc samples of x, y, z
+              out, optional (3, 60, 8) float32 array the feature is written into, e.g. a view of the model input
+@ return    : (3, 60, 8) float32 feature of x, y, z
+'''
+def accfeature(acc_data, out=None):
+    ps = acc_stft.magnitude(acc_data)[:, 5:]  # 3, 60, 8
+    return scale.standardize(ps, out)
+
+
+# streaming stft, only the frames completed by new samples are computed
+mic_stream = stft.StreamingSTFT(mic_stft, frames=66)
+acc_stream = stft.StreamingSTFT(acc_stft, frames=8, channels=3)
+
+
+'''
+@ name      : micfeature_stream
+@ desc      : mic feature of the rolling spectrogram, fed with the unseen part of the window
+@ parameter : mic_data, (7500,) latest mic samples
+              count, the number of the last sample, RingBuffer.count of the mic
+              out, optional (60, 66) float32 array the feature is written into
+@ return    : (60, 66) feature, None if no new frame is complete
+'''
+def micfeature_stream(mic_data, count, out=None):
+    if mic_stream.update(mic_data, count) == 0:
+        return None
+    return scale.standardize(mic_stream.spectrogram()[5:], out)
+
+
+'''
+@ name      : accfeature_stream
+@ desc      : acc feature of the rolling spectrograms, fed with the unseen part of the window
+@ parameter : acc_data, (3, 500) latest acc samples
+              count, the number of the last sample, RingBuffer.count of the acc
+              out, optional (3, 60, 8) float32 array the feature is written into
+@ return    : (3, 60, 8) feature of x, y, z, None if no new frame is complete
+'''
+def accfeature_stream(acc_data, count, out=None):
+    if acc_stream.update(acc_data, count) == 0:
+        return None
+    return scale.standardize(acc_stream.spectrogram()[:, 5:], out)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to standardize the feature columns without sklearn.
+          it only needs numpy, so the edge feature processes and the server feature script share it.
+@ author: Bohao Chu
+'''
+import numpy as np
+
+
+# relative error bound of the variance, sklearn accumulates in float64 and uses its eps
+_EPS = np.finfo(np.float64).eps
+
+
+'''
+@ name      : Standardizer
+@ desc      : column standardization, zero mean and unit variance of every column of every matrix.
+              the result equals StandardScaler().fit_transform(x) for each (rows, columns) matrix:
+              the variance uses ddof=0 and constant columns are only centered. a column is constant
+              if its variance is within the error bound of the two pass variance, the bound of
+              sklearn's _is_constant_feature: var <= n * eps * var + (n * mean * eps) ** 2.
+              mean and variance are accumulated in float64 like sklearn, the data stays float32.
+              the statistics and the scratch buffers are kept per input shape, so a call allocates nothing.
+@ parameter :
+@ return    :
+'''
+class Standardizer:
+    def __init__(self):
+        self.plans = {}
+
+    # float32 buffers for one input shape (..., rows, columns)
+    def _plan(self, shape):
+        plan = self.plans.get(shape)
+        if plan is None:
+            stat = shape[:-2] + (1, shape[-1])
+            plan = {'square': np.empty(shape, dtype=np.float32),
+                    'mean': np.empty(stat, dtype=np.float64),
+                    'var': np.empty(stat, dtype=np.float64),
+                    'bound': np.empty(stat, dtype=np.float64),
+                    'std': np.empty(stat, dtype=np.float32),
+                    'constant': np.empty(stat, dtype=bool)}
+            self.plans[shape] = plan
+        return plan
+
+    '''
+        @ name      : __call__
+        @ desc      : standardize the columns of x into out
+        @ parameter : x, (..., rows, columns) matrices, e.g. (60, 66) or (3, 60, 8)
+                      out, float32 array of the same shape, may be x itself or a view of the model input.
+                      a new array is returned if it is None
+        @ return    : out
+    '''
+    def __call__(self, x, out=None):
+        x = np.asarray(x)
+        plan = self._plan(x.shape)
+        if out is None:
+            out = np.empty(x.shape, dtype=np.float32)
+        mean, var, bound, std, square = plan['mean'], plan['var'], plan['bound'], plan['std'], plan['square']
+        n = x.shape[-2]
+        np.mean(x, axis=-2, keepdims=True, dtype=np.float64, out=mean)
+        np.subtract(x, mean, out=out, casting='unsafe')
+        np.multiply(out, out, out=square)
+        np.mean(square, axis=-2, keepdims=True, dtype=np.float64, out=var)
+        # bound = n * eps * var + (n * mean * eps) ** 2
+        np.multiply(mean, n * _EPS, out=bound)
+        np.multiply(bound, bound, out=bound)
+        bound += n * _EPS * var
+        np.less_equal(var, bound, out=plan['constant'])
+        np.sqrt(var, out=std, casting='unsafe')
+        np.copyto(std, 1, where=plan['constant'])
+        np.divide(out, std, out=out)
+        return out
+
+
+# shared instance of the process
+standardize = Standardizer()
+
+
+if __name__ == "__main__":
+    import time
+    from sklearn import preprocessing
+    x = np.abs(np.random.randn(60, 66)).astype(np.float32)
+    x[:, 3] = 2
+    x[:, 4] = 0.1
+    out = np.empty_like(x)
+    print("max error :", np.max(np.abs(preprocessing.StandardScaler().fit_transform(x) - standardize(x, out))))
+    # small scales are standardized like sklearn does, not treated as constant
+    for size in (1e-3, 1e-6, 1e-9):
+        small = x * np.float32(size)
+        print(f"scale {size:.0e} :", np.max(np.abs(preprocessing.StandardScaler().fit_transform(small) - standardize(small))))
+    start = time.time()
+    for i in range(1000):
+        preprocessing.StandardScaler().fit_transform(x)
+    print("sklearn   :", (time.time() - start) / 1000)
+    start = time.time()
+    for i in range(1000):
+        standardize(x, out)
+    print("numpy     :", (time.time() - start) / 1000)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to compute the short time fourier transform with a cached plan.
+          it only needs numpy, so the edge feature processes and the server feature script share it.
+@ author: Bohao Chu
+'''
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+# amount of input shapes an engine keeps buffers for, the oldest plan is dropped first
+MAX_PLANS = 8
+
+
+'''
+@ name      : STFT
+@ desc      : stft engine for one (nperseg, noverlap, fs) configuration, created once and called per window.
+              the hann window, the frame layout and the float32 buffers are prepared once per input shape.
+              the result equals scipy.signal.stft(x, fs, nperseg=nperseg, noverlap=noverlap,
+              boundary=None, padded=False) in float32 precision.
+@ parameter : nperseg, length of each segment
+              noverlap, amount of points to overlap between segments
+              fs, sampling frequency
+@ return    :
+'''
+class STFT:
+    def __init__(self, nperseg=128, noverlap=16, fs=1.0):
+        self.nperseg = nperseg
+        self.noverlap = noverlap
+        self.step = nperseg - noverlap
+        self.fs = fs
+        # periodic hann window, the default window of scipy.signal.stft
+        n = np.arange(nperseg)
+        window = 0.5 - 0.5 * np.cos(2 * np.pi * n / nperseg)
+        # scaling='spectrum' of scipy divides by the sum of the window
+        self.window = (window / window.sum()).astype(np.float32)
+        self.freqs = np.fft.rfftfreq(nperseg, 1 / fs)
+        self.plans = {}
+
+    '''
+        @ name      : frames
+        @ desc      : amount of frames of a signal with n samples
+    '''
+    def frames(self, n):
+        return (n - self.nperseg) // self.step + 1
+
+    # buffers for one input shape, (..., n) => frames (..., frames, nperseg), magnitude (..., nperseg/2+1, frames)
+    def _plan(self, shape):
+        plan = self.plans.get(shape)
+        if plan is None:
+            frames = self.frames(shape[-1])
+            if len(self.plans) >= MAX_PLANS:
+                self.plans.pop(next(iter(self.plans)))
+            plan = {'input': np.empty(shape, dtype=np.float32),
+                    'segments': np.empty(shape[:-1] + (frames, self.nperseg), dtype=np.float32),
+                    'magnitude': np.empty(shape[:-1] + (len(self.freqs), frames), dtype=np.float32)}
+            self.plans[shape] = plan
+        return plan
+
+    def _segments(self, x):
+        x = np.asarray(x)
+        plan = self._plan(x.shape)
+        signal = plan['input']
+        np.copyto(signal, x, casting='unsafe')
+        segments = plan['segments']
+        # overlapping frames as a view of the signal, then windowed into the float32 buffer
+        strides = signal.strides[:-1] + (self.step * signal.strides[-1], signal.strides[-1])
+        view = as_strided(signal, shape=segments.shape, strides=strides, writeable=False)
+        np.multiply(view, self.window, out=segments)
+        return plan, segments
+
+    '''
+        @ name      : __call__
+        @ desc      : complex stft of x
+        @ parameter : x, (..., n) signal, one or more channels
+        @ return    : (..., nperseg/2+1, frames) complex spectrum, the same as Zxx of scipy.signal.stft
+    '''
+    def __call__(self, x):
+        _, segments = self._segments(x)
+        return np.swapaxes(np.fft.rfft(segments, axis=-1), -1, -2)
+
+    '''
+        @ name      : magnitude
+        @ desc      : magnitude of the stft of x, abs(Zxx), written into a float32 buffer of the engine
+        @ parameter : x, (..., n) signal, one or more channels
+        @ return    : (..., nperseg/2+1, frames) float32, the buffer is reused by the next call with the same shape
+    '''
+    def magnitude(self, x):
+        plan, segments = self._segments(x)
+        spectrum = np.fft.rfft(segments, axis=-1)
+        np.abs(np.swapaxes(spectrum, -1, -2), out=plan['magnitude'])
+        return plan['magnitude']
+
+
+'''
+@ name      : StreamingSTFT
+@ desc      : streaming magnitude stft on top of an STFT engine.
+              new samples are pushed as they arrive, only the frames they complete are computed
+              and written into a rolling spectrogram of the latest frames. the spectrogram is kept
+              twice along the time axis like the RingBuffer, so it is always one contiguous slice.
+              the frames are aligned to the start of the stream, not to the start of a window.
+@ parameter : engine, STFT engine of the signal
+              frames, the amount of frames kept in the spectrogram, e.g. 66 for the mic feature
+              channels, the amount of channels, e.g. 3 for (x, y, z) of acc
+@ return    :
+'''
+class StreamingSTFT:
+    def __init__(self, engine, frames, channels=1):
+        self.engine = engine
+        self.frames = frames
+        self.channels = channels
+        self.data = np.zeros((channels, len(engine.freqs), 2 * frames), dtype=np.float32)
+        # next write position of the spectrogram, always in [0, frames)
+        self.head = 0
+        self.reset()
+
+    '''
+        @ name      : reset
+        @ desc      : forget the pending samples, e.g. after a gap in the stream. the spectrogram is kept.
+    '''
+    def reset(self):
+        # samples after the start of the next frame
+        self.pending = np.zeros((self.channels, 0), dtype=np.float32)
+        # number of the last sample seen by update, None before the first update
+        self.count = None
+
+    '''
+        @ name      : push
+        @ desc      : append new samples and compute the frames they complete
+        @ parameter : samples, (n,) for one channel or (channels, n)
+        @ return    : the amount of new frames
+    '''
+    def push(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).reshape(self.channels, -1)
+        signal = np.concatenate((self.pending, samples), axis=-1)
+        step = self.engine.step
+        if signal.shape[-1] < self.engine.nperseg:
+            self.pending = signal
+            return 0
+        amount = self.engine.frames(signal.shape[-1])
+        # frames older than the spectrogram are not computed at all
+        skip = max(amount - self.frames, 0)
+        used = signal[:, skip * step:(amount - 1) * step + self.engine.nperseg]
+        magnitude = self.engine.magnitude(used)
+        self._write(magnitude)
+        self.pending = signal[:, amount * step:].copy()
+        return amount - skip
+
+    def _write(self, magnitude):
+        amount = magnitude.shape[-1]
+        first = min(amount, self.frames - self.head)
+        rest = amount - first
+        for start in (self.head, self.head + self.frames):
+            self.data[..., start:start + first] = magnitude[..., :first]
+        self.data[..., :rest] = magnitude[..., first:]
+        self.data[..., self.frames:self.frames + rest] = magnitude[..., first:]
+        self.head = (self.head + amount) % self.frames
+
+    '''
+        @ name      : update
+        @ desc      : push the part of a window which has not been seen yet, e.g. a RingBuffer snapshot.
+                      the stream restarts from the whole window if samples were missed in between.
+        @ parameter : window, (n,) or (channels, n) latest samples of the signal
+                      count, the number of the last sample of the window, e.g. RingBuffer.count
+        @ return    : the amount of new frames
+    '''
+    def update(self, window, count):
+        window = np.asarray(window)
+        new = window.shape[-1] if self.count is None else count - self.count
+        if new < 0 or new > window.shape[-1]:
+            self.reset()
+            new = window.shape[-1]
+        self.count = count
+        if new == 0:
+            return 0
+        return self.push(window[..., window.shape[-1] - new:])
+
+    '''
+        @ name      : spectrogram
+        @ desc      : view of the latest frames in time order, nothing is copied
+        @ parameter : none
+        @ return    : (nperseg/2+1, frames) for one channel or (channels, nperseg/2+1, frames)
+    '''
+    def spectrogram(self):
+        window = self.data[..., self.head:self.head + self.frames]
+        if self.channels == 1:
+            return window[0]
+        return window
+
+
+if __name__ == "__main__":
+    import time
+    import scipy.signal
+    mic = np.random.randint(-2000, 2000, 7500).astype(np.int16)
+    mic_stft = STFT(nperseg=128, noverlap=16, fs=15000)
+    _, _, ps = scipy.signal.stft(mic, fs=15000, nperseg=128, noverlap=16, boundary=None, padded=False)
+    print("max error :", np.max(np.abs(np.abs(ps) - mic_stft.magnitude(mic))))
+    start = time.time()
+    for i in range(100):
+        scipy.signal.stft(mic, fs=15000, nperseg=128, noverlap=16, boundary=None, padded=False)
+    print("scipy     :", (time.time() - start) / 100)
+    start = time.time()
+    for i in range(100):
+        mic_stft.magnitude(mic)
+    print("engine    :", (time.time() - start) / 100)
+    # the stream gets blocks of 1500 samples, the last 66 frames equal the stft of the latest 7408 samples
+    mic_stream = StreamingSTFT(mic_stft, frames=66)
+    stream = np.random.randint(-2000, 2000, 150000).astype(np.int16)
+    start = time.time()
+    for end in range(1500, len(stream) + 1, 1500):
+        mic_stream.update(stream[end - 7500:end] if end >= 7500 else stream[:end], end)
+    print("stream    :", (time.time() - start) / (len(stream) // 1500))
+    frames = mic_stft.frames(len(stream))
+    window = stream[(frames - 66) * mic_stft.step:(frames - 1) * mic_stft.step + 128]
+    print("max error :", np.max(np.abs(mic_stream.spectrogram() - mic_stft.magnitude(window))))
@@ -21,6 +21,7 @@ import numpy as np
 import multiprocessing as mp
 import tflite_runtime.interpreter as tflite
 import datav.datav as dv
+import datav.snapshot as sn
 import feature.feature as fea
 import arguments as arg
 import smbus
@@ -229,22 +230,23 @@ class MicFeatureProcess(mp.Process):
     def run(self):
         print("# mic feature process id : ", os.getpid())
         i = 0
+        # windows of the next debug plots, joined once when they are saved
         tmp = []
-        tmp_feature = np.random.random((60, 1))
+        tmp_feature = []
         while True:
             if not self.queue_in.empty():
                 result = self.queue_in.get()
                 mic_feature = fea.micfeature(result['mic'])
                 if i < 100:
                     i = i + 1
-                    tmp.extend(result['mic'])
-                    tmp_feature = np.concatenate((tmp_feature, mic_feature), axis=1)
+                    tmp.append(np.asarray(result['mic']))
+                    tmp_feature.append(mic_feature)
                 else:
                     i = 0
-                    dv.datasave('mic', tmp)
-                    fea.featuresave('mic', np.array(tmp_feature))
+                    dv.datasave('mic', np.concatenate(tmp))
+                    fea.featuresave('mic', np.concatenate(tmp_feature, axis=1))
                     tmp = []
-                    tmp_feature = mic_feature
+                    tmp_feature = [mic_feature]
 
                 self.queue_out.put(mic_feature)
 
@@ -258,21 +260,22 @@ class AccFeatureProcess(mp.Process):
     def run(self):
         print("# acc feature process id : ", os.getpid())
         i = 0
+        # windows of the next debug plots, joined once when they are saved
         tmp = []
-        tmp_feature = np.random.random((60, 1))
+        tmp_feature = []
         while True:
             if not self.queue_in.empty():
                 result = self.queue_in.get()
                 acc_x_feature, acc_y_feature, acc_z_feature = fea.accfreature(result['acc_x'], result['acc_y'], result['acc_z'])
                 if i < 100:
                     i = i + 1
-                    tmp.extend(result['acc_x'])
-                    tmp_feature = np.concatenate((tmp_feature, acc_x_feature), axis=1)
+                    tmp.append(np.asarray(result['acc_x']))
+                    tmp_feature.append(acc_x_feature)
                 else:
                     i = 0
-                    dv.datasave('acc_x', tmp)
-                    fea.featuresave('acc_x', tmp_feature)
-                    tmp_feature = acc_x_feature
+                    dv.datasave('acc_x', np.concatenate(tmp))
+                    fea.featuresave('acc_x', np.concatenate(tmp_feature, axis=1))
+                    tmp_feature = [acc_x_feature]
                     tmp = []
                 laser_feature = result['laser']
                 data = {'acc_x': acc_x_feature,
@@ -373,6 +376,9 @@ if __name__ == "__main__":
         m.start()
         a.start()
         r.start()
+        # the debug plots are drawn by their own low priority process
+        if arg.snapshot:
+            sn.Renderer().start()
     finally:
         time.sleep(3)
         print("\n# please type ctrl+c to stop program")
@@ -9,7 +9,6 @@ print("# current path :", SCRIPT_DIR)
 print("# source  path :", SOURCE_DIR)
 print("# root    path :", ROOT_DIR)
 print("# server    ip : https://bohao.de/ecsk/datav\n")
-time.sleep(5)
 
 import drivers.mpuDriver as mpuD
 import drivers.micDriver as micD
@@ -19,9 +18,17 @@ import time, statistics
 import threading
 import numpy as np
 import multiprocessing as mp
-import tflite_runtime.interpreter as tflite
 import datav.datav as dv
+import buffer.buffer as rb
+import channel.channel as ch
+import stage.stage as st
+import stage.pipeline as pp
+import queue
 import feature.feature as fea
+import model.pool as pl
+import model.cascade as cs
+import model.registry as rg
+import model.runner as rn
 import arguments as arg
 import smbus
 
@@ -38,21 +45,21 @@ import adafruit_amg88xx
 @ return    :
 '''
 class DataProcess(mp.Process):
-    def __init__(self, queue_mic, queue_acc):
+    def __init__(self, channel, stop):
         super(DataProcess, self).__init__()
         self.mpu = mpuD.MPU9250()
         self.mic, self.audio = micD.INMP441()
         self.laser = laserD.VL53L1()
         self.eye = adafruit_amg88xx.AMG88XX(busio.I2C(board.SCL, board.SDA))
         self.color = smbus.SMBus(3)
-        self.queue_mic = queue_mic
-        self.queue_acc = queue_acc
+        self.channel = channel
+        self.stop = stop
+        # shared busy flag, set by the Pipeline
+        self.busy_flag = None
 
         # raw data placeholder
-        self.mic_todo = [1 for i in range(7500)]
-        self.acc_x_todo = [1 for i in range(500)]
-        self.acc_y_todo = [1 for i in range(500)]
-        self.acc_z_todo = [1 for i in range(500)]
+        self.mic_todo = rb.RingBuffer(7500, fill=1)
+        self.acc_todo = rb.RingBuffer(500, channels=3, fill=1)
         self.eye_todo = [1 for i in range(64)]
         self.laser_todo = [1 for i in range(2)]
         self.color_todo = [1 for i in range(3)]
@@ -70,7 +77,7 @@ class DataProcess(mp.Process):
         while self.mic.is_active():
             stream_data = self.mic.read(arg.chunk, exception_on_overflow=False)
             mic_data = np.frombuffer(stream_data, dtype=np.int16)
-            self.mic_todo = mic_data
+            self.mic_todo.write(mic_data)
 
     '''
         @ name      : mpu_acc_raw
@@ -81,15 +88,14 @@ class DataProcess(mp.Process):
     def mpu_acc_raw(self):
         time.sleep(2)
         print(f"# mpu acc is sampling")
+        self.mpu.configFIFO(arg.acc_rate)
         while True:
-            acc = self.mpu.readAccel()
-            del self.acc_x_todo[0]
-            del self.acc_y_todo[0]
-            del self.acc_z_todo[0]
-            self.acc_x_todo.append(acc['x'])
-            self.acc_y_todo.append(acc['y'])
-            self.acc_z_todo.append(acc['z'])
-            time.sleep(0.0006)
+            # burst read the hardware FIFO, the sample rate is fixed by the sensor
+            data = self.mpu.readFIFO()
+            if data['overflow']:
+                print(f"# mpu fifo overflow {self.mpu.fifo_overflow}, the acc samples have a gap")
+            self.acc_todo.write(data['acc'])
+            time.sleep(arg.fifo_interval)
 
     def mpu_mag_raw(self):
         time.sleep(2)
@@ -176,6 +182,7 @@ class DataProcess(mp.Process):
 
 
     def run(self):
+        st.ignore_interrupt()
         try:
             print("# data process id : ", os.getpid())
             threads = []
@@ -194,159 +201,309 @@ class DataProcess(mp.Process):
             t7 = threading.Thread(target=self.mpu_mag_raw)
             threads.append(t7)
             for t in threads:
+                # the sampling threads end with the process
+                t.daemon = True
                 t.start()
-            while True:
-                if not self.queue_mic.full():
-                    data = {'mic': self.mic_todo}
-                    self.queue_mic.put(data)
-                if not self.queue_acc.full():
-                    data = {'acc_x': self.acc_x_todo,
-                            'acc_y': self.acc_y_todo,
-                            'acc_z': self.acc_z_todo,
-                            'laser': self.laser_todo,
-                            'eye'  : self.eye_todo,
-                            'color': self.color_todo,
-                            'bme': self.bme_todo,
-                            'mag': self.mag_todo
-                            }
-                    self.queue_acc.put(data)
-                time.sleep(0.5)
-        except KeyboardInterrupt:
-            print('# DATAP: Is KeyboardInterrupt')
+            stats = st.StageStats('data', arg.stats_period, flag=self.busy_flag)
+            counts = None
+            while not self.stop.is_set():
+                stats.idle()
+                self.stop.wait(arg.publish_interval)
+                # a window is only published if new samples have arrived since the last one
+                if counts == (self.mic_todo.count, self.acc_todo.count):
+                    stats.skip('duplicate')
+                    continue
+                counts = (self.mic_todo.count, self.acc_todo.count)
+                stats.busy()
+                # write the windows in place into shared memory, nothing is pickled
+                frame = self.channel.claim()
+                frame['mic_count'][0] = self.mic_todo.snapshot(frame['mic'])
+                frame['acc_count'][0] = self.acc_todo.snapshot(frame['acc'])
+                frame['laser'][:] = self.laser_todo
+                frame['eye'][:] = self.eye_todo
+                frame['color'][:] = self.color_todo
+                frame['bme'][:] = self.bme_todo
+                frame['mag'][:] = self.mag_todo
+                self.channel.publish()
+        finally:
+            print('# DATAP: Is stopped')
             self.mic.stop_stream()
             self.mic.close()
             self.audio.terminate()
             self.laser.stop_ranging()
-            sys.exit()
 
 
 class MicFeatureProcess(mp.Process):
-    def __init__(self, queue_in, queue_out):
+    def __init__(self, channel, queue_out, stop):
         super(MicFeatureProcess, self).__init__()
-        self.queue_in = queue_in
+        self.channel = channel
         self.queue_out = queue_out
+        self.stop = stop
+        self.busy_flag = None
 
     def run(self):
+        st.ignore_interrupt()
         print("# mic feature process id : ", os.getpid())
-        while True:
-            if not self.queue_in.empty():
-                result = self.queue_in.get()
-                mic_feature = fea.micfeature(result['mic'])
-                self.queue_out.put(mic_feature)
+        stats = st.StageStats('mic feature', arg.stats_period, flag=self.busy_flag)
+        seq = 0
+        while not self.stop.is_set():
+            stats.idle()
+            seq, frame = self.channel.get(seq, timeout=arg.stage_timeout)
+            if frame is None:
+                continue
+            stats.busy()
+            if arg.stream_stft:
+                mic_feature = fea.micfeature_stream(frame['mic'], int(frame['mic_count'][0]))
+            else:
+                mic_feature = fea.micfeature(frame['mic'])
+            # drop the feature if the window was overwritten while it was used
+            # None tells the model process that the mic feature of this window is unchanged
+            if not self.channel.valid(seq):
+                fea.mic_stream.reset()
+            else:
+                self.queue_out.put((seq, mic_feature))
+        # do not wait for the model process to take the last feature
+        self.queue_out.cancel_join_thread()
 
 
 class AccFeatureProcess(mp.Process):
-    def __init__(self, queue_in, queue_out):
+    def __init__(self, channel, queue_out, stop):
         super(AccFeatureProcess, self).__init__()
-        self.queue_in = queue_in
+        self.channel = channel
         self.queue_out = queue_out
+        self.stop = stop
+        self.busy_flag = None
 
     def run(self):
+        st.ignore_interrupt()
         print("# acc feature process id : ", os.getpid())
-        while True:
-            if not self.queue_in.empty():
-                result = self.queue_in.get()
-                acc_x_feature, acc_y_feature, acc_z_feature = fea.accfreature(result['acc_x'], result['acc_y'], result['acc_z'])
-                laser_feature = result['laser']
-                data = {'acc_x': acc_x_feature,
-                        'acc_y': acc_y_feature,
-                        'acc_z': acc_z_feature,
-                        'laser': laser_feature,
-                        'eye'  : result['eye'],
-                        'color': result['color'],
-                        'bme': result['bme'],
-                        'mag': result['mag']
-                        }
-                self.queue_out.put(data)
+        stats = st.StageStats('acc feature', arg.stats_period, flag=self.busy_flag)
+        seq = 0
+        while not self.stop.is_set():
+            stats.idle()
+            seq, frame = self.channel.get(seq, timeout=arg.stage_timeout)
+            if frame is None:
+                continue
+            stats.busy()
+            acc = frame['acc']
+            if arg.stream_stft:
+                acc_feature = fea.accfeature_stream(acc, int(frame['acc_count'][0]))
+            else:
+                acc_feature = fea.accfeature(acc)
+            # acc is None if the acc feature of this window is unchanged
+            data = {'acc': acc_feature,
+                    'laser': frame['laser'].tolist(),
+                    'energy': cs.energy(frame['mic'], acc),
+                    'eye'  : frame['eye'].tolist(),
+                    'color': frame['color'].tolist(),
+                    'bme': frame['bme'].tolist(),
+                    'mag': frame['mag'].tolist()
+                    }
+            # drop the feature if the window was overwritten while it was used
+            if self.channel.valid(seq):
+                self.queue_out.put((seq, data))
+            else:
+                fea.acc_stream.reset()
+        # do not wait for the model process to take the last feature
+        self.queue_out.cancel_join_thread()
 
 
 class RecoModelProcess(mp.Process):
-    def __init__(self, queue_mic_fea, queue_acc_fea):
+    def __init__(self, queue_mic_fea, queue_acc_fea, queue_uplink, stop):
         super(RecoModelProcess, self).__init__()
         self.queue_mic_fea = queue_mic_fea
         self.queue_acc_fea = queue_acc_fea
+        self.queue_uplink = queue_uplink
+        self.stop = stop
+        self.busy_flag = None
 
 
-        # feature placeholder
-        self.mic_feature = np.random.random((60, 66))
-        self.acc_x_feature = np.random.random((60, 8))
-        self.acc_y_feature = np.random.random((60, 8))
-        self.acc_z_feature = np.random.random((60, 8))
-        self.laser_feature = np.random.random((60, 1))
+        # latest features, None until the first window has arrived
+        self.mic_feature = None
+        self.acc_x_feature = None
+        self.acc_y_feature = None
+        self.acc_z_feature = None
+        self.laser_feature = None
 
     '''
-         @ name      : mpu_gyr_raw
-         @ desc      : sample from gyr sensor MPU9250 and save raw for training
-         @ parameter : self
+         @ name      : emit
+         @ desc      : predictions of one window, sent by the uplink stage while the next window is invoked
+         @ parameter : window, (mic, acc_x, acc_y, acc_z, laser, result) features of the window
+                       spin_output, prediction of the spin model, 0 if it did not run
          @ return    : none
      '''
+    def emit(self, window, spin_output):
+        mic_feature, acc_x_feature, acc_y_feature, acc_z_feature, laser_feature, result = window
+        pred_resutl = []
+        if spin_output > 0.2:
+            pred_resutl.append('spin')
+            # print(f"spin       : Y")
+        if result['laser'][0] == 2:
+            pred_resutl.append('upward')
+            #print(f"upward     : Y")
+        if result['laser'][0] == 0:
+            pred_resutl.append('downward')
+            # print(f"downward   : Y")
+        self.queue_uplink.put((mic_feature, acc_x_feature, acc_y_feature, acc_z_feature, laser_feature, pred_resutl,
+                               result['laser'][1], result['eye'], result['color'], result['bme'], result['mag']))
 
+    '''
+         @ name      : flush
+         @ desc      : invoke the windows written into the input and emit their predictions,
+                       a batch which is not full leaves the other rows unused
+         @ parameter : runner, ModelRunner the windows are written into
+                       batch, the windows of the rows
+         @ return    : none
+     '''
+    def flush(self, runner, batch):
+        spin_output = runner.invoke()[arg.final_output].reshape(runner.batch, -1)[:len(batch), 0]
+        for window, output in zip(batch, spin_output):
+            self.emit(window, output)
 
     def run(self):
+        st.ignore_interrupt()
         print("# model process id : ", os.getpid())
-        spin_interpreter = tflite.Interpreter(model_path=f"{ROOT_DIR}/models/inference/spin.tflite")
-        spin_interpreter.allocate_tensors()
-        #print(spin_interpreter.get_output_details())
+        stats = st.StageStats('model', arg.stats_period, {'mic': self.queue_mic_fea, 'acc': self.queue_acc_fea},
+                               self.busy_flag)
+        # threads, delegate and parallel workers of the interpreters are set in arguments.py
+        pool = pl.InterpreterPool()
+        # the model of the scene is reloaded by the registry when its file changes
+        registry = rg.ModelRegistry(pool)
+        spin = registry.get(arg.dataset, 'spin_int8' if arg.int8 else 'spin')
+        # inputs and outputs by signature name, model_batch windows per invoke
+        runner = rn.ModelRunner(pool, spin.key, arg.model_batch)
+        # cheap tiers which decide whether the cnn runs at all
+        cascade = cs.Cascade() if arg.cascade else None
+        # sequence number of the latest mic feature, True while a mic feature has not been used
+        mic_seq = 0
+        mic_fresh = False
+        # windows written into the input and waiting for a full batch
+        batch = []
+
+        while not self.stop.is_set():
+            stats.idle()
+            # a new acc feature triggers the inference, wait for it without spinning
+            try:
+                acc_seq, result = self.queue_acc_fea.get(timeout=arg.stage_timeout)
+            except queue.Empty:
+                # no new window for a while, a batch which is not full is not kept waiting
+                if batch:
+                    self.flush(runner, batch)
+                    batch = []
+                continue
+            # the mic feature of the same window may arrive a bit later
+            while mic_seq < acc_seq:
+                try:
+                    mic_seq, mic_feature = self.queue_mic_fea.get(timeout=arg.stage_timeout)
+                except queue.Empty:
+                    break
+                if mic_feature is not None:
+                    self.mic_feature = mic_feature
+                    mic_fresh = True
+            # inference runs once per new synchronized (mic, acc) window
+            if mic_seq != acc_seq:
+                stats.skip('unpaired')
+                continue
+            if result['acc'] is None and not mic_fresh:
+                stats.skip('duplicate')
+                continue
+            if result['acc'] is not None:
+                self.acc_x_feature, self.acc_y_feature, self.acc_z_feature = result['acc']
+            if self.mic_feature is None or self.acc_x_feature is None:
+                stats.skip('incomplete')
+                continue
+            stats.busy()
+            mic_fresh = False
+            changed = registry.changed()
+            if changed:
+                # a new model file, the waiting windows are invoked by the old interpreter before the swap
+                if batch:
+                    self.flush(runner, batch)
+                    batch = []
+                if registry.reload(changed):
+                    runner = rn.ModelRunner(pool, spin.key, arg.model_batch)
+            self.laser_feature = result['laser'][0]
+            window = (self.mic_feature, self.acc_x_feature, self.acc_y_feature, self.acc_z_feature,
+                      self.laser_feature, result)
+            if cascade is not None and not cascade.gate(result['laser'][0], result['energy'])[0]:
+                # the windows of the batch are older, their predictions are sent first
+                if batch:
+                    self.flush(runner, batch)
+                    batch = []
+                self.emit(window, 0)
+                continue
+            # the features are written in place into the row of the window
+            row = len(batch)
+            runner.write(row, 'mic', self.mic_feature)
+            runner.write(row, 'acc', np.stack((self.acc_x_feature, self.acc_y_feature, self.acc_z_feature)))
+            runner.write(row, 'laser', self.laser_feature)
+            batch.append(window)
+            if len(batch) < runner.batch:
+                continue
+            self.flush(runner, batch)
+            batch = []
+        # the windows of a batch which is not full are still predicted
+        if batch:
+            self.flush(runner, batch)
+        # do not wait for the uplink process to take the last result
+        self.queue_uplink.cancel_join_thread()
 
-        input_details = spin_interpreter.get_input_details()
-        #print(spin_interpreter.get_input_details())
-        input_index = input_details[0]['index']
-        # 0-fin: 96, 1-mic: 58, 2-x:68, 3-y:78, 4-z:88, 5-laser:93
 
-        while True:
-            pred_resutl = []
-            if not self.queue_mic_fea.empty():
-                result = self.queue_mic_fea.get()
-                self.mic_feature = result
-            if not self.queue_acc_fea.empty():
-                result = self.queue_acc_fea.get()
-                self.acc_x_feature = result['acc_x']
-                self.acc_y_feature = result['acc_y']
-                self.acc_z_feature = result['acc_z']
-                self.laser_feature = [result['laser'][0] for i in range(60)]
-                laser_data = result['laser'][1]
-                eye_data = result['eye']
-                color_data = result['color']
-                bme_data = result['bme']
-                mag_data = result['mag']
-                merge_feature = np.column_stack((self.mic_feature,
-                                                 self.acc_x_feature,
-                                                 self.acc_y_feature,
-                                                 self.acc_z_feature,
-                                                 self.laser_feature)).astype(dtype=np.float32).reshape(1, 60, 91, 1)
-
-                spin_interpreter.set_tensor(input_index, merge_feature)
-                spin_interpreter.invoke()
-                spin_output = spin_interpreter.get_tensor(96)
-                if spin_output > 0.2:
-                    pred_resutl.append('spin')
-                    # print(f"spin       : Y")
-                if result['laser'][0] == 2:
-                    pred_resutl.append('upward')
-                    #print(f"upward     : Y")
-                if result['laser'][0] == 0:
-                    pred_resutl.append('downward')
-                    # print(f"downward   : Y")
-
-                # 0.18s
-                dv.featurev(self.mic_feature, self.acc_x_feature, self.acc_y_feature, self.acc_z_feature,self.laser_feature[0], pred_resutl, laser_data, eye_data, color_data, bme_data, mag_data)
+'''
+@ name      : UplinkProcess
+@ desc      : sends the features and predictions to the data visualization server,
+              the blocking http call runs apart from the model process
+@ parameter : queue_in, Mailbox of the featurev arguments
+              stop, stop event
+@ return    :
+'''
+class UplinkProcess(mp.Process):
+    def __init__(self, queue_in, stop):
+        super(UplinkProcess, self).__init__()
+        self.queue_in = queue_in
+        self.stop = stop
+        self.busy_flag = None
+
+    def run(self):
+        st.ignore_interrupt()
+        print("# uplink process id : ", os.getpid())
+        stats = st.StageStats('uplink', arg.stats_period, {'model': self.queue_in}, self.busy_flag)
+        while not self.stop.is_set():
+            stats.idle()
+            try:
+                result = self.queue_in.get(timeout=arg.stage_timeout)
+            except queue.Empty:
+                continue
+            stats.busy()
+            # 0.18s
+            dv.featurev(*result)
 
 if __name__ == "__main__":
+    print("main process id:", os.getpid())
+    channel_raw = ch.SharedFrameChannel({'mic': ((7500,), np.float32),
+                                         'mic_count': ((1,), np.int64),
+                                         'acc': ((3, 500), np.float32),
+                                         'acc_count': ((1,), np.int64),
+                                         'laser': ((2,), np.float32),
+                                         'eye': ((64,), np.float32),
+                                         'color': ((3,), np.float32),
+                                         'bme': ((3,), np.float32),
+                                         'mag': ((4,), np.float32)})
+    stop = mp.Event()
+    pipeline = pp.Pipeline(stop, arg.stats_period)
+    # latest wins between the stages, stale windows are dropped and counted
+    queue_mic_fea = pipeline.mailbox('mic feature', arg.mailbox_depth)
+    queue_acc_fea = pipeline.mailbox('acc feature', arg.mailbox_depth)
+    queue_uplink = pipeline.mailbox('uplink', arg.mailbox_depth)
+    pipeline.add('data', DataProcess(channel_raw, stop))
+    pipeline.add('mic feature', MicFeatureProcess(channel_raw, queue_mic_fea, stop))
+    pipeline.add('acc feature', AccFeatureProcess(channel_raw, queue_acc_fea, stop))
+    pipeline.add('model', RecoModelProcess(queue_mic_fea, queue_acc_fea, queue_uplink, stop))
+    pipeline.add('uplink', UplinkProcess(queue_uplink, stop))
+    print("\n# please type ctrl+c to stop program")
     try:
-        print("main process id:", os.getpid())
-        queue_mic_raw = mp.Queue()
-        queue_acc_raw = mp.Queue()
-        queue_mic_fea = mp.Queue()
-        queue_acc_fea = mp.Queue()
-        d = DataProcess(queue_mic_raw, queue_acc_raw)
-        m = MicFeatureProcess(queue_mic_raw, queue_mic_fea)
-        a = AccFeatureProcess(queue_acc_raw, queue_acc_fea)
-        r = RecoModelProcess(queue_mic_fea, queue_acc_fea)
-        d.start()
-        m.start()
-        a.start()
-        r.start()
+        # the stages leave their loops within stage_timeout after ctrl+c
+        pipeline.run()
     finally:
-        time.sleep(3)
-        print("\n# please type ctrl+c to stop program")
-
+        channel_raw.close()
+        channel_raw.unlink()
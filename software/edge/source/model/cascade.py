@@ -0,0 +1,81 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to gate the expensive models by cheap signals
+@ author: Bohao Chu
+'''
+import os, sys
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(SOURCE_DIR)
+import time
+import numpy as np
+import arguments as arg
+
+
+# tiers of the cascade in the order they run, the last one is the expensive model
+TIERS = ['laser', 'energy', 'cnn']
+
+
+'''
+@ name      : energy
+@ desc      : cheap activity signal of the raw windows, computed in the feature process
+@ parameter : mic, (n,) raw mic window
+              acc, (3, n) raw acc window
+@ return    : [mic energy, acc energy], standard deviation of the mic and of the most moving acc axis
+'''
+def energy(mic, acc):
+    return [float(np.std(mic)), float(np.max(np.std(acc, axis=-1)))]
+
+
+'''
+@ name      : Cascade
+@ desc      : early exit inference. the cheap tiers run first and the expensive model only runs
+              when a cheap tier detects activity or is not sure that the seat is idle:
+              laser  - a laser trend (up or down) is activity, the cnn runs
+              energy - mic and acc energy below their thresholds is idle, the cnn is skipped
+              cnn    - everything else
+              the laser mlp of the final model is no tier, its only input is the laser trend
+              the laser tier already decides on.
+              the tier which decided every window is counted and printed every period seconds.
+@ parameter : period, seconds between two reports, 0 disables the report, default arg.stats_period
+@ return    :
+'''
+class Cascade:
+    def __init__(self, period=None):
+        self.period = arg.stats_period if period is None else period
+        self.counts = {tier: 0 for tier in TIERS}
+        self.since = time.perf_counter()
+
+    '''
+        @ name      : gate
+        @ desc      : decide whether the expensive model has to run for one window
+        @ parameter : trend, laser[0] of the window, 0 downward, 1 still, 2 upward
+                      energy, [mic energy, acc energy] of the window, see energy()
+        @ return    : (run, tier), run is True if the expensive model must be invoked,
+                      tier is the name of the tier which decided
+    '''
+    def gate(self, trend, energy):
+        tier, run = self._gate(trend, energy)
+        self.counts[tier] = self.counts[tier] + 1
+        if self.period and time.perf_counter() - self.since >= self.period:
+            print(self.report())
+            self.counts = {name: 0 for name in TIERS}
+            self.since = time.perf_counter()
+        return run, tier
+
+    def _gate(self, trend, energy):
+        if trend != 1:
+            return 'laser', True
+        if energy[0] < arg.cascade_mic_energy and energy[1] < arg.cascade_acc_energy:
+            return 'energy', False
+        return 'cnn', True
+
+    '''
+        @ name      : report
+        @ desc      : share of the windows decided by every tier since the last report
+    '''
+    def report(self):
+        total = max(sum(self.counts.values()), 1)
+        shares = ', '.join(f"{tier} {100 * count / total:5.1f}%" for tier, count in self.counts.items())
+        return f"# cascade     : {sum(self.counts.values())} windows, {shares}"
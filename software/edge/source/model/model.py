@@ -0,0 +1,108 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to feed the features into the tflite models
+@ author: Bohao Chu
+'''
+import numpy as np
+
+
+# column blocks of the merged feature (1, 60, 91, 1)
+COLUMNS = {'mic': (0, 66),
+           'acc_x': (66, 74),
+           'acc_y': (74, 82),
+           'acc_z': (82, 90),
+           'acc': (66, 90),
+           'laser': (90, 91)}
+
+
+'''
+@ name      : InputAssembler
+@ desc      : writes the feature blocks straight into the input tensor of one or more interpreters.
+              the tensor buffer of tflite is taken by interpreter.tensor(), so there is no merged
+              array, no float64 stage and no set_tensor copy, every block is copied once per interpreter.
+              the blocks stay in the tensor between two invokes, only changed blocks need to be written.
+              int8/uint8 inputs of quantized models are quantized on the way with the input parameters.
+@ parameter : interpreters, allocated interpreters which share the input layout
+              input_index, index of the input tensor
+              columns, {name: (start, end)} column blocks of the input, default COLUMNS
+@ return    :
+'''
+class InputAssembler:
+    def __init__(self, interpreters, input_index, columns=COLUMNS):
+        self.tensors = []
+        for interpreter in interpreters:
+            detail = [d for d in interpreter.get_input_details() if d['index'] == input_index][0]
+            # scale 0 means a float input
+            self.tensors.append((interpreter.tensor(input_index), detail['quantization'], detail['dtype']))
+        self.columns = columns
+        # float32 scratch blocks of the quantization
+        self.scratch = {}
+
+    '''
+        @ name      : write
+        @ desc      : copy one block into the input of every interpreter.
+                      no view of the tensor is kept, tflite refuses to invoke while one exists.
+        @ parameter : name, name of the block, e.g. 'mic'
+                      data, (rows, columns) block, (3, rows, columns) for 'acc', or a scalar for the whole block
+                      row, window of a batched input, 0 for a single window
+        @ return    : none
+    '''
+    def write(self, name, data, row=0):
+        start, end = self.columns[name]
+        data = np.asarray(data)
+        if data.ndim == 3:
+            # (3, 60, 8) => (60, 3, 8), the acc axes are side by side in the input
+            data = data.swapaxes(0, 1)
+        for tensor, (scale, zero_point), dtype in self.tensors:
+            block = tensor()[row, :, start:end, 0]
+            if data.ndim == 3:
+                block = block.reshape(block.shape[0], data.shape[1], -1)
+            if scale:
+                np.copyto(block, self._quantize(name, data, block.shape, scale, zero_point, dtype), casting='unsafe')
+            else:
+                np.copyto(block, data, casting='unsafe')
+            del block
+
+    # q = clip(rint(x / scale + zero_point)) in a float32 scratch block
+    def _quantize(self, name, data, shape, scale, zero_point, dtype):
+        scratch = self.scratch.get(name)
+        if scratch is None:
+            scratch = self.scratch[name] = np.empty(shape, dtype=np.float32)
+        info = np.iinfo(dtype)
+        np.copyto(scratch, data, casting='unsafe')
+        np.divide(scratch, scale, out=scratch)
+        np.add(scratch, zero_point, out=scratch)
+        np.rint(scratch, out=scratch)
+        np.clip(scratch, info.min, info.max, out=scratch)
+        return scratch
+
+
+'''
+@ name      : outputs
+@ desc      : output tensors of a model by the names of its signature, e.g. output_1 of a final model
+@ parameter : interpreter, allocated interpreter
+@ return    : {name: index}, empty if the model has no signature
+'''
+def outputs(interpreter):
+    if not interpreter.get_signature_list():
+        return {}
+    runner = interpreter.get_signature_runner()
+    return {name: detail['index'] for name, detail in runner.get_output_details().items()}
+
+
+'''
+@ name      : output
+@ desc      : float value of an output tensor, int8/uint8 outputs of quantized models are dequantized
+@ parameter : interpreter, invoked interpreter
+              index, index of the output tensor
+@ return    : float32 array of the output
+'''
+def output(interpreter, index):
+    value = interpreter.get_tensor(index).astype(np.float32)
+    detail = [d for d in interpreter.get_output_details() if d['index'] == index][0]
+    scale, zero_point = detail['quantization']
+    if scale:
+        value = (value - zero_point) * scale
+    return value
+
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to create the tflite interpreters and to invoke them in parallel
+@ author: Bohao Chu
+'''
+import os, sys
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(SOURCE_DIR)
+import time
+from concurrent.futures import ThreadPoolExecutor
+import tflite_runtime.interpreter as tflite
+import arguments as arg
+
+
+'''
+@ name      : create
+@ desc      : interpreter of one model with the threading and delegate options of the deployment
+@ parameter : model_path, path of the tflite model
+              num_threads, threads of one invoke, default arg.num_threads
+              xnnpack, False disables the default XNNPACK delegate, default arg.xnnpack
+@ return    : interpreter with allocated tensors
+'''
+def create(model_path, num_threads=None, xnnpack=None):
+    num_threads = arg.num_threads if num_threads is None else num_threads
+    xnnpack = arg.xnnpack if xnnpack is None else xnnpack
+    options = {'model_path': model_path, 'num_threads': num_threads}
+    if not xnnpack:
+        # the enum is tflite.OpResolverType, older runtimes without it always apply the default delegates
+        resolver = getattr(tflite, 'OpResolverType', None)
+        if resolver is not None:
+            options['experimental_op_resolver_type'] = resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        else:
+            print("# the tflite runtime has no OpResolverType, XNNPACK stays enabled")
+    if arg.delegate_path:
+        options['experimental_delegates'] = [tflite.load_delegate(arg.delegate_path)]
+    interpreter = tflite.Interpreter(**options)
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+'''
+@ name      : InterpreterPool
+@ desc      : named interpreters of one process. independent models are invoked in parallel worker
+              threads, tflite releases the GIL while it runs, and the latency of every invoke is
+              accounted per model and printed every period seconds.
+@ parameter : workers, amount of models invoked at the same time, default arg.model_workers
+              period, seconds between two reports, 0 disables the report, default arg.stats_period
+@ return    :
+'''
+class InterpreterPool:
+    def __init__(self, workers=None, period=None):
+        self.workers = arg.model_workers if workers is None else workers
+        self.period = arg.stats_period if period is None else period
+        self.executor = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        self.interpreters = {}
+        self.latency = {}
+        self.since = time.perf_counter()
+
+    '''
+        @ name      : load
+        @ desc      : create the interpreter of a model and add it to the pool
+        @ parameter : name, name of the model, e.g. 'spin'
+                      model_path, path of the tflite model
+        @ return    : the interpreter
+    '''
+    def load(self, name, model_path, **options):
+        self.interpreters[name] = create(model_path, **options)
+        self.latency[name] = []
+        return self.interpreters[name]
+
+    def _invoke(self, name):
+        start = time.perf_counter()
+        self.interpreters[name].invoke()
+        return time.perf_counter() - start
+
+    '''
+        @ name      : invoke
+        @ desc      : invoke the given models, in parallel if the pool has more than one worker
+        @ parameter : names, names of the models, default all models of the pool
+        @ return    : {name: seconds} latency of every invoke
+    '''
+    def invoke(self, names=None):
+        names = list(self.interpreters) if names is None else names
+        if self.executor is None or len(names) == 1:
+            latency = {name: self._invoke(name) for name in names}
+        else:
+            latency = dict(zip(names, self.executor.map(self._invoke, names)))
+        for name, seconds in latency.items():
+            self.latency[name].append(seconds)
+        if self.period and time.perf_counter() - self.since >= self.period:
+            self.report()
+        return latency
+
+    '''
+        @ name      : report
+        @ desc      : print mean and max invoke latency of every model since the last report
+    '''
+    def report(self):
+        for name, latency in self.latency.items():
+            if latency:
+                print(f"# {name} invoke : {len(latency)} times, mean {1000 * sum(latency) / len(latency):.1f} ms, "
+                      f"max {1000 * max(latency):.1f} ms")
+            self.latency[name] = []
+        self.since = time.perf_counter()
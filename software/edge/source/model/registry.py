@@ -0,0 +1,155 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to load the tflite models of the scenes and to reload them when they change
+@ author: Bohao Chu
+'''
+import os, sys
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.dirname(SCRIPT_DIR)
+ROOT_DIR = os.path.dirname(SOURCE_DIR)
+sys.path.append(SOURCE_DIR)
+import time
+from collections import OrderedDict
+import model.pool as pl
+import arguments as arg
+
+
+'''
+@ name      : ModelHandle
+@ desc      : one loaded model. the registry replaces interpreter when the file changes and
+              increases version, a user which keeps views or indices of the interpreter
+              compares version to notice the swap.
+@ parameter :
+@ return    :
+'''
+class ModelHandle:
+    def __init__(self, key, path):
+        self.key = key
+        self.path = path
+        self.interpreter = None
+        self.version = 0
+        self.stamp = None
+
+
+'''
+@ name      : ModelRegistry
+@ desc      : tflite models of the scenes, models/<scene dir>/<name>.tflite.
+              the interpreters are created from the model files, which tflite maps into memory
+              instead of reading them, so the pages of a model are shared and loaded on demand.
+              poll() checks the files of the loaded models and swaps a changed model by a new,
+              allocated interpreter between two windows, no process has to be restarted.
+              changed() and reload() are the two steps of poll(), for a user which has to flush
+              windows through the old interpreter before the swap.
+              only the latest used scenes are kept loaded, the least recently used one is dropped.
+@ parameter : pool, InterpreterPool the models are loaded into, a new pool if it is None
+              root, the models directory
+              scenes, amount of scenes kept loaded, default arg.registry_scenes
+              interval, seconds between two checks of the files, default arg.registry_interval
+@ return    :
+'''
+class ModelRegistry:
+    def __init__(self, pool=None, root=f"{ROOT_DIR}/models", scenes=None, interval=None):
+        self.pool = pl.InterpreterPool() if pool is None else pool
+        self.root = root
+        self.scenes = arg.registry_scenes if scenes is None else scenes
+        self.interval = arg.registry_interval if interval is None else interval
+        # {scene: {name: ModelHandle}}, the most recently used scene is the last one
+        self.loaded = OrderedDict()
+        self.checked = time.perf_counter()
+
+    '''
+        @ name      : path
+        @ desc      : file of a model, the scene directories are mapped by arg.model_scenes
+        @ parameter : scene, e.g. '350', 'seat', 'cnc'
+                      name, e.g. 'spin'
+        @ return    : path of the tflite file
+    '''
+    def path(self, scene, name):
+        return f"{self.root}/{arg.model_scenes.get(scene, scene)}/{name}.tflite"
+
+    '''
+        @ name      : get
+        @ desc      : handle of a model, it is loaded if it is not loaded yet
+        @ parameter : scene, e.g. '350'
+                      name, e.g. 'spin'
+        @ return    : ModelHandle
+    '''
+    def get(self, scene, name):
+        if scene in self.loaded:
+            self.loaded.move_to_end(scene)
+        else:
+            self.loaded[scene] = {}
+            while len(self.loaded) > self.scenes:
+                self._unload(next(iter(self.loaded)))
+        models = self.loaded[scene]
+        if name not in models:
+            models[name] = ModelHandle(f"{scene}/{name}", self.path(scene, name))
+            self._load(models[name])
+        return models[name]
+
+    def _stamp(self, path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, handle):
+        stamp = self._stamp(handle.path)
+        # the interpreter is complete before it replaces the old one
+        handle.interpreter = self.pool.load(handle.key, handle.path)
+        handle.stamp = stamp
+        handle.version = handle.version + 1
+        print(f"# model {handle.key} loaded, version {handle.version}")
+
+    def _unload(self, scene):
+        for handle in self.loaded.pop(scene).values():
+            self.pool.interpreters.pop(handle.key, None)
+            self.pool.latency.pop(handle.key, None)
+            handle.interpreter = None
+        print(f"# models of scene {scene} unloaded")
+
+    '''
+        @ name      : changed
+        @ desc      : the loaded models whose files changed, at most once per interval.
+                      nothing is reloaded yet, the caller can finish the work of the old interpreters.
+        @ parameter : none
+        @ return    : the handles whose files changed
+    '''
+    def changed(self):
+        if time.perf_counter() - self.checked < self.interval:
+            return []
+        self.checked = time.perf_counter()
+        changed = []
+        for models in self.loaded.values():
+            for handle in models.values():
+                try:
+                    if self._stamp(handle.path) != handle.stamp:
+                        changed.append(handle)
+                except OSError as e:
+                    print(f"# model {handle.key} is not checked: {e}")
+        return changed
+
+    '''
+        @ name      : reload
+        @ desc      : swap the interpreters of the given models by new ones.
+                      a file which is being copied is retried at the next check.
+        @ parameter : handles, e.g. the result of changed()
+        @ return    : the handles which were reloaded
+    '''
+    def reload(self, handles):
+        reloaded = []
+        for handle in handles:
+            try:
+                self._load(handle)
+                reloaded.append(handle)
+            except (OSError, ValueError) as e:
+                print(f"# model {handle.key} is not reloaded: {e}")
+        return reloaded
+
+    '''
+        @ name      : poll
+        @ desc      : reload the loaded models whose files changed, see changed and reload
+        @ parameter : none
+        @ return    : the handles which were reloaded
+    '''
+    def poll(self):
+        return self.reload(self.changed())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to run a tflite model by the names of its signature, one or more windows per invoke
+@ author: Bohao Chu
+'''
+import numpy as np
+import model.model as md
+
+
+'''
+@ name      : ModelRunner
+@ desc      : runner of one model of an InterpreterPool. the input and the outputs are resolved by the
+              names of the model signature, e.g. output_1 for the prediction of a final model, so a
+              re-exported model with other tensor indices needs no change in the code.
+              the batch dimension of the input is resized with resize_tensor_input, a batch of
+              windows, several recent windows or the windows of several sensors, runs in one invoke.
+@ parameter : pool, InterpreterPool which holds the interpreter
+              key, name of the model in the pool, e.g. ModelHandle.key
+              batch, amount of windows per invoke
+              columns, {name: (start, end)} column blocks of the input, default COLUMNS
+@ return    :
+'''
+class ModelRunner:
+    def __init__(self, pool, key, batch=1, columns=md.COLUMNS):
+        self.pool = pool
+        self.key = key
+        self.interpreter = pool.interpreters[key]
+        if self.interpreter.get_signature_list():
+            runner = self.interpreter.get_signature_runner()
+            inputs = runner.get_input_details()
+            outputs = runner.get_output_details()
+        else:
+            # models without signature are resolved by their tensor names
+            inputs = {d['name']: d for d in self.interpreter.get_input_details()}
+            outputs = {d['name']: d for d in self.interpreter.get_output_details()}
+        self.input_name, detail = list(inputs.items())[0]
+        self.input_index = detail['index']
+        self.outputs = {name: d['index'] for name, d in outputs.items()}
+        # the exporter and the edge agree on the merged feature, a model of another layout is refused
+        width = max(end for start, end in columns.values())
+        if detail['shape'][2] != width:
+            raise ValueError(f"input {list(detail['shape'])} of {key} does not match {width} feature columns")
+        # 'all' is the whole window, used by run
+        self.columns = dict(columns, all=(0, detail['shape'][2]))
+        self.batch = None
+        self.resize(batch)
+
+    '''
+        @ name      : resize
+        @ desc      : set the amount of windows per invoke, the tensors are allocated again
+        @ parameter : batch, amount of windows
+        @ return    : none
+    '''
+    def resize(self, batch):
+        if batch == self.batch:
+            return
+        shape = [d for d in self.interpreter.get_input_details() if d['index'] == self.input_index][0]['shape']
+        if shape[0] != batch:
+            self.interpreter.resize_tensor_input(self.input_index, [batch] + list(shape[1:]))
+            self.interpreter.allocate_tensors()
+        self.batch = batch
+        # the views of the old tensors are gone, the assembler takes the new buffer
+        self.assembler = md.InputAssembler([self.interpreter], self.input_index, self.columns)
+
+    '''
+        @ name      : write
+        @ desc      : write one feature block of one window into the input, see InputAssembler.write
+        @ parameter : row, window in the batch
+                      name, name of the block, e.g. 'mic'
+                      data, the block
+        @ return    : none
+    '''
+    def write(self, row, name, data):
+        self.assembler.write(name, data, row)
+
+    '''
+        @ name      : invoke
+        @ desc      : run the model on the windows written into the input
+        @ parameter : none
+        @ return    : {output name: (batch, ...) float32}, int8 outputs are dequantized
+    '''
+    def invoke(self):
+        self.pool.invoke([self.key])
+        return {name: md.output(self.interpreter, index) for name, index in self.outputs.items()}
+
+    '''
+        @ name      : run
+        @ desc      : run the model on a stack of complete inputs in one invoke
+        @ parameter : windows, (batch, rows, columns, 1) merged features
+        @ return    : {output name: (batch, ...) float32}
+    '''
+    def run(self, windows):
+        windows = np.asarray(windows)
+        self.resize(len(windows))
+        for row, window in enumerate(windows):
+            self.write(row, 'all', window[..., 0])
+        return self.invoke()
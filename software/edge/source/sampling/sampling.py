@@ -19,8 +19,11 @@ import time, statistics
 import threading
 import numpy as np
 import multiprocessing as mp
-import tflite_runtime.interpreter as tflite
+import model.pool as pl
+import model.registry as rg
+import model.model as md
 import datav.datav as dv
+import datav.snapshot as sn
 import feature.feature as fea
 import arguments as arg
 import smbus, wave, datetime
@@ -257,22 +260,23 @@ class MicFeatureProcess(mp.Process):
     def run(self):
         print("# mic feature process id : ", os.getpid())
         i = 0
+        # windows of the next debug plots, joined once when they are saved
         tmp = []
-        tmp_feature = np.random.random((60, 1))
+        tmp_feature = []
         while True:
             if not self.queue_in.empty():
                 result = self.queue_in.get()
                 mic_feature = fea.micfeature(result['mic'])
                 if i < 100:
                     i = i + 1
-                    tmp.extend(result['mic'])
-                    tmp_feature = np.concatenate((tmp_feature, mic_feature), axis=1)
+                    tmp.append(np.asarray(result['mic']))
+                    tmp_feature.append(mic_feature)
                 else:
                     i = 0
-                    dv.datasave('mic', tmp)
-                    fea.featuresave('mic', np.array(tmp_feature))
+                    dv.datasave('mic', np.concatenate(tmp))
+                    fea.featuresave('mic', np.concatenate(tmp_feature, axis=1))
                     tmp = []
-                    tmp_feature = mic_feature
+                    tmp_feature = [mic_feature]
 
                 self.queue_out.put(mic_feature)
 
@@ -286,21 +290,22 @@ class AccFeatureProcess(mp.Process):
     def run(self):
         print("# acc feature process id : ", os.getpid())
         i = 0
+        # windows of the next debug plots, joined once when they are saved
         tmp = []
-        tmp_feature = np.random.random((60, 1))
+        tmp_feature = []
         while True:
             if not self.queue_in.empty():
                 result = self.queue_in.get()
                 acc_x_feature, acc_y_feature, acc_z_feature = fea.accfreature(result['acc_x'], result['acc_y'], result['acc_z'])
                 if i < 100:
                     i = i + 1
-                    tmp.extend(result['acc_x'])
-                    tmp_feature = np.concatenate((tmp_feature, acc_x_feature), axis=1)
+                    tmp.append(np.asarray(result['acc_x']))
+                    tmp_feature.append(acc_x_feature)
                 else:
                     i = 0
-                    dv.datasave('acc_x', tmp)
-                    fea.featuresave('acc_x', tmp_feature)
-                    tmp_feature = acc_x_feature
+                    dv.datasave('acc_x', np.concatenate(tmp))
+                    fea.featuresave('acc_x', np.concatenate(tmp_feature, axis=1))
+                    tmp_feature = [acc_x_feature]
                     tmp = []
                 laser_feature = result['laser']
                 data = {'acc_x': acc_x_feature,
@@ -338,12 +343,14 @@ class RecoModelProcess(mp.Process):
 
     def run(self):
         print("# model process id : ", os.getpid())
-        spin_interpreter = tflite.Interpreter(model_path=f"{ROOT_DIR}/models/inference/on.tflite")
-        spin_interpreter.allocate_tensors()
-        up_interpreter = tflite.Interpreter(model_path=f"{ROOT_DIR}/models/inference/on.tflite")
-        up_interpreter.allocate_tensors()
-        down_interpreter = tflite.Interpreter(model_path=f"{ROOT_DIR}/models/inference/on.tflite")
-        down_interpreter.allocate_tensors()
+        # the three models are independent, arg.model_workers of them run in parallel
+        pool = pl.InterpreterPool()
+        registry = rg.ModelRegistry(pool)
+        spin_interpreter = pool.load('spin', registry.path(arg.dataset, 'on'))
+        up_interpreter = pool.load('up', registry.path(arg.dataset, 'on'))
+        down_interpreter = pool.load('down', registry.path(arg.dataset, 'on'))
+        # outputs of the final model by signature name, output_1 final, output_2 mic, output_3 acc x, output_6 laser
+        outputs = md.outputs(spin_interpreter)
         #print(spin_interpreter.get_output_details())
 
         input_details = spin_interpreter.get_input_details()
@@ -373,17 +380,13 @@ class RecoModelProcess(mp.Process):
                                                  self.laser_feature)).astype(dtype=np.float32).reshape(1, 60, 91, 1)
 
                 spin_interpreter.set_tensor(input_index, merge_feature)
-                spin_interpreter.invoke()
-                spin_output = spin_interpreter.get_tensor(58)
-
                 up_interpreter.set_tensor(input_index, merge_feature)
-                up_interpreter.invoke()
-                up_output = up_interpreter.get_tensor(68)
-
                 down_interpreter.set_tensor(input_index, merge_feature)
-                down_interpreter.invoke()
-                down_output = down_interpreter.get_tensor(93)
-                downa_output = down_interpreter.get_tensor(96)
+                pool.invoke()
+                spin_output = md.output(spin_interpreter, outputs['output_2'])
+                up_output = md.output(up_interpreter, outputs['output_3'])
+                down_output = md.output(down_interpreter, outputs['output_6'])
+                downa_output = md.output(down_interpreter, outputs['output_1'])
                 # print(downa_output, spin_output, up_output, down_output)
                 if spin_output > 0.2:
                     pred_resutl.append('spin')
@@ -414,6 +417,9 @@ if __name__ == "__main__":
         m.start()
         a.start()
         r.start()
+        # the debug plots are drawn by their own low priority process
+        if arg.snapshot:
+            sn.Renderer().start()
     finally:
         time.sleep(3)
         print("\n# please type ctrl+c to stop program")
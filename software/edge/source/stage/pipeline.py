@@ -0,0 +1,107 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to run the pipeline stages side by side and to report their occupancy
+@ author: Bohao Chu
+'''
+import time
+import multiprocessing as mp
+import channel.channel as ch
+
+
+'''
+@ name      : Pipeline
+@ desc      : scheduler of the stage processes. every stage runs in its own process and the stages
+              are linked by capped mailboxes, so window N+1 is featurized while window N is invoked
+              and window N-1 is sent, and the throughput is set by the slowest stage.
+              the main process samples which stages are busy and how full the mailboxes are
+              and prints the occupancy every period seconds.
+@ parameter : stop, mp.Event which stops all stages
+              period, seconds between two reports, 0 disables the report
+              interval, seconds between two samples of the occupancy
+@ return    :
+'''
+class Pipeline:
+    def __init__(self, stop, period=10, interval=0.05):
+        self.stop = stop
+        self.period = period
+        self.interval = interval
+        self.stages = {}
+        self.mailboxes = {}
+
+    '''
+        @ name      : mailbox
+        @ desc      : capped mailbox between two stages, the oldest window is dropped if it is full
+        @ parameter : name, name in the report, e.g. 'mic feature'
+                      depth, the amount of windows kept
+        @ return    : Mailbox
+    '''
+    def mailbox(self, name, depth=1):
+        self.mailboxes[name] = ch.Mailbox(depth)
+        return self.mailboxes[name]
+
+    '''
+        @ name      : add
+        @ desc      : add a stage process, its busy_flag is set to a shared flag of the pipeline.
+                      the process passes it to its StageStats.
+        @ parameter : name, name in the report
+                      process, the stage process, not started yet
+        @ return    : process
+    '''
+    def add(self, name, process):
+        process.busy_flag = mp.Value('b', 0, lock=False)
+        self.stages[name] = process
+        return process
+
+    def _reset(self):
+        self.samples = 0
+        self.busy = {name: 0 for name in self.stages}
+        self.overlap = 0
+        self.fill = {name: 0 for name in self.mailboxes}
+        self.since = time.perf_counter()
+
+    def _sample(self):
+        busy = [name for name, process in self.stages.items() if process.busy_flag.value]
+        for name in busy:
+            self.busy[name] = self.busy[name] + 1
+        self.overlap = self.overlap + len(busy)
+        for name, mailbox in self.mailboxes.items():
+            self.fill[name] = self.fill[name] + mailbox.qsize()
+        self.samples = self.samples + 1
+
+    '''
+        @ name      : report
+        @ desc      : occupancy since the last report
+        @ return    : busy share of every stage, mean amount of stages busy at the same time
+                      and mean fill of every mailbox
+    '''
+    def report(self):
+        samples = max(self.samples, 1)
+        busy = ', '.join(f"{name} {100 * count / samples:.0f}%" for name, count in self.busy.items())
+        fill = ', '.join(f"{name} {self.fill[name] / samples:.2f}/{mailbox.depth}"
+                         for name, mailbox in self.mailboxes.items())
+        return f"# pipeline    : busy {busy}; {self.overlap / samples:.2f} stages busy at once; queued {fill}"
+
+    '''
+        @ name      : run
+        @ desc      : start all stages and sample the occupancy until they end.
+                      ctrl+c sets the stop event and waits for the stages to leave their loops.
+        @ parameter : none
+        @ return    : none
+    '''
+    def run(self):
+        for process in self.stages.values():
+            process.start()
+        self._reset()
+        try:
+            while any(process.is_alive() for process in self.stages.values()):
+                self.stop.wait(self.interval)
+                self._sample()
+                if self.period and time.perf_counter() - self.since >= self.period:
+                    print(self.report())
+                    self._reset()
+        except KeyboardInterrupt:
+            self.stop.set()
+        finally:
+            for process in self.stages.values():
+                process.join()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3.8.9
+'''
+Copyright © 2022 DUE TUL
+@ desc  : This modules is used to account the idle and busy time of pipeline stages
+@ author: Bohao Chu
+'''
+import time
+import signal
+
+
+'''
+@ name      : StageStats
+@ desc      : idle/busy accounting of one stage loop. call idle() before waiting for input
+              and busy() before working on it, a summary is printed every period seconds.
+@ parameter : name, name of the stage
+              period, seconds between two reports, 0 disables the report
+              inputs, {name: Mailbox} whose dropped items are reported
+              flag, optional shared mp.Value which is 1 while the stage is busy, see Pipeline
+@ return    :
+'''
+class StageStats:
+    def __init__(self, name, period=10, inputs=None, flag=None):
+        self.name = name
+        self.period = period
+        self.inputs = inputs or {}
+        self.flag = flag
+        self.state = 'idle'
+        self.since = time.perf_counter()
+        self.idle_time = 0
+        self.busy_time = 0
+        self.windows = 0
+        # {reason: amount} of inputs which were skipped without work
+        self.skipped = {}
+        self._reset()
+
+    def _reset(self):
+        self.report_time = self.since
+        self.report_cpu = time.process_time()
+        self.report_idle = self.idle_time
+        self.report_busy = self.busy_time
+        self.report_windows = self.windows
+
+    def _switch(self, state):
+        now = time.perf_counter()
+        if self.state == 'idle':
+            self.idle_time = self.idle_time + now - self.since
+        else:
+            self.busy_time = self.busy_time + now - self.since
+        self.state = state
+        self.since = now
+        if self.flag is not None:
+            self.flag.value = int(state == 'busy')
+        if self.period and now - self.report_time >= self.period:
+            print(self.report())
+            self._reset()
+
+    '''
+        @ name      : idle
+        @ desc      : the stage starts to wait for input
+    '''
+    def idle(self):
+        self._switch('idle')
+
+    '''
+        @ name      : busy
+        @ desc      : the stage starts to work on one window
+    '''
+    def busy(self):
+        self.windows = self.windows + 1
+        self._switch('busy')
+
+    '''
+        @ name      : skip
+        @ desc      : count one input which was skipped, e.g. a duplicate window
+        @ parameter : reason, name of the counter
+    '''
+    def skip(self, reason):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    '''
+        @ name      : report
+        @ desc      : summary since the last report
+        @ return    : busy and idle share of the wall time, cpu share of the process, window rate
+                      and the total drops and skips of the inputs
+    '''
+    def report(self):
+        wall = max(self.since - self.report_time, 1e-9)
+        idle = self.idle_time - self.report_idle
+        busy = self.busy_time - self.report_busy
+        cpu = time.process_time() - self.report_cpu
+        windows = self.windows - self.report_windows
+        report = f"# {self.name:<12}: busy {100 * busy / wall:5.1f}%, idle {100 * idle / wall:5.1f}%, " \
+                 f"cpu {100 * cpu / wall:5.1f}%, {windows / wall:.1f} windows/s"
+        for name, mailbox in self.inputs.items():
+            report = report + f", {name} dropped {mailbox.drops()}"
+        for reason, amount in self.skipped.items():
+            report = report + f", {reason} skipped {amount}"
+        return report
+
+
+'''
+@ name      : ignore_interrupt
+@ desc      : ignore ctrl+c in a child process, the main process stops the children by a stop event
+'''
+def ignore_interrupt():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
@@ -1,6 +1,6 @@
 import scipy
 import numpy as np
-from sklearn.preprocessing import scale
+from feature.scale import standardize
 import scipy.signal as signal
 import tflite_runtime.interpreter as tflite
 
@@ -12,7 +12,7 @@ def feature(audio_data, dis_data, mpu_x, mpu_y, mpu_z):
                                  boundary=None,
                                  padded=None)
 
-    audio_feature = scale(abs(ps[1:, :]))
+    audio_feature = standardize(abs(ps[1:, :]))
 
     # (1, )  (128, 1)
     laser_feature = [dis_data for j in range(128)]
@@ -24,21 +24,21 @@ def feature(audio_data, dis_data, mpu_x, mpu_y, mpu_z):
                                  noverlap=128,
                                  boundary=None,
                                  padded=None)
-    mpu_x_feature = scale(abs(ps[1:, :]))
+    mpu_x_feature = standardize(abs(ps[1:, :]))
     f, t, ps = scipy.signal.stft(mpu_y,
                                  fs=1000,
                                  nperseg=256,
                                  noverlap=128,
                                  boundary=None,
                                  padded=None)
-    mpu_y_feature = scale(abs(ps[1:, :]))
+    mpu_y_feature = standardize(abs(ps[1:, :]))
     f, t, ps = scipy.signal.stft(mpu_z,
                                  fs=1000,
                                  nperseg=256,
                                  noverlap=128,
                                  boundary=None,
                                  padded=None)
-    mpu_z_feature = scale(abs(ps[1:, :]))
+    mpu_z_feature = standardize(abs(ps[1:, :]))
 
     merge_feature = np.column_stack((audio_feature,
                                      laser_feature,
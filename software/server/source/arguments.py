@@ -38,4 +38,14 @@ train_path = f"{SOURCE_DIR}/dataset/tfrecords/{scene}/{activity}/train.tfrecord"
 test_path = f"{SOURCE_DIR}/dataset/tfrecords/{scene}/{activity}/test.tfrecord"
 
 tensorflow_model_path = f"{SOURCE_DIR}/models/tensorflow/{scene}/{activity}"
-tflite_model_path = f"{SOURCE_DIR}/models/tflite/{scene}/{activity}"
\ No newline at end of file
+tflite_model_path = f"{SOURCE_DIR}/models/tflite/{scene}/{activity}"
+
+# int8 tflite model: conversion on/off, calibration windows of the train TFRecord,
+# largest accepted accuracy drop compared to the float model
+int8 = True
+calibration_samples = 200
+int8_tolerance = 0.02
+
+# activities merged into one multi-head tflite model, one named output per activity
+fused_activities = ["spin", "up", "down"]
+fused_model_path = f"{SOURCE_DIR}/models/tflite/{scene}/fused"
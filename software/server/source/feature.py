@@ -7,16 +7,22 @@ Copyright © 2022 DUE TUL
 """
 import os
 import time
+import sys
 import arguments as arg
-import scipy.signal
 import librosa
 import numpy as np
 import tensorflow as tf
 from tqdm import tqdm
 from sklearn.decomposition import PCA
-from sklearn import preprocessing
 import matplotlib.pyplot as plt
+# the stft engine and the standardization are shared with the edge feature processes
+sys.path.append(os.path.join(arg.ROOT_DIR, 'edge', 'source', 'feature'))
+import stft
+import scale
 
+# stft plans of the mic and acc feature
+mic_stft = stft.STFT(nperseg=128, noverlap=16, fs=15000)
+acc_stft = stft.STFT(nperseg=128, noverlap=80, fs=1000)
 
 """
 @ name     : _float_feature
@@ -112,15 +118,14 @@ def create_feature_tfrecord(list_path, train_save_path, test_save_path):
                 laser_datas.append(x[i])
                 laser_labels.append(int(laser_label))
 
-    scaler = preprocessing.StandardScaler()
     label = True
     with tf.io.TFRecordWriter(train_save_path) as train, tf.io.TFRecordWriter(test_save_path) as test:
         for i in tqdm(range(len(mic_datas))):
             if mic_labels[i] != acc_labels[i] != laser_labels[i]:
                 return
             # MIC : Raw(7500,), Feature(60, 66)
-            f, t, ps = scipy.signal.stft(mic_datas[i], fs=15000, nperseg=128, noverlap=16, boundary=None, padded=False)
-            mic_feature = scaler.fit_transform(abs(ps[5:]))
+            ps = mic_stft.magnitude(mic_datas[i])
+            mic_feature = scale.standardize(ps[5:])
             '''
             if label:
                 label = False
@@ -134,12 +139,12 @@ def create_feature_tfrecord(list_path, train_save_path, test_save_path):
             '''
             # plt.imshow(mic_feature, cmap=plt.cm.gray, interpolation='nearest')
             # ACC : Raw(500, ), Feature(60, 8)
-            _, _, ps = scipy.signal.stft(acc_x_datas[i], fs=1000, nperseg=128, noverlap=80, boundary=None, padded=False)
-            acc_x_feature = scaler.fit_transform(abs(ps[5:]))
-            _, _, ps = scipy.signal.stft(acc_y_datas[i], fs=1000, nperseg=128, noverlap=80, boundary=None, padded=False)
-            acc_y_feature = scaler.fit_transform(abs(ps[5:]))
-            _, _, ps = scipy.signal.stft(acc_z_datas[i], fs=1000, nperseg=128, noverlap=80, boundary=None, padded=False)
-            acc_z_feature = scaler.fit_transform(abs(ps[5:]))
+            ps = acc_stft.magnitude(acc_x_datas[i])
+            acc_x_feature = scale.standardize(ps[5:])
+            ps = acc_stft.magnitude(acc_y_datas[i])
+            acc_y_feature = scale.standardize(ps[5:])
+            ps = acc_stft.magnitude(acc_z_datas[i])
+            acc_z_feature = scale.standardize(ps[5:])
 
             # LASER : Raw(1, ), Feature(60, 1)
             laser_feature = [laser_datas[i] for j in range(60)]
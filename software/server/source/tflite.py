@@ -1,45 +1,49 @@
+import os
 import tensorflow as tf
 import reader
 import arguments as arg
-import pathlib
-'''
-train_dataset = reader.train_reader_tfrecord(
-    data_path=config.trainpath,
-    num_epochs=1,
-    batch_Size=128)
-
+import numpy as np
 
-for batch_idx, data_batch in enumerate(train_dataset):
-    global data
-    data = data_batch['data'].numpy().reshape(-1, 128, 54, 1)
-    break
 
+'''
+@ name     : representative_data_gen
+@ function : calibration sample of the int8 conversion, merged features of the train TFRecord
+'''
 def representative_data_gen():
-    global data
-    for input_value in tf.data.Dataset.from_tensor_slices(data).batch(1).take(100):
-        yield [input_value]
-
-converter = tf.lite.TFLiteConverter.from_saved_model("saved_model/")
-converter.optimizations = [tf.lite.Optimize.DEFAULT]
-converter.representative_dataset = representative_data_gen
-# Ensure that if any ops can't be quantized, the converter throws an error
-converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
-# Set the input and output tensors to uint8 (APIs added in r2.3)
-converter.inference_input_type = tf.uint8
-converter.inference_output_type = tf.uint8
-tflite_model_quant = converter.convert()
-
-
-# Save the model.
-tflite_models_dir = pathlib.Path("tflite_models/")
-tflite_models_dir.mkdir(exist_ok=True, parents=True)
-
-# Save the quantized model:
-tflite_model_quant_file = tflite_models_dir/"model_quant.tflite"
-tflite_model_quant_file.write_bytes(tflite_model_quant)
-print("OK")
+  train_dataset = reader.train_reader_tfrecord(data_path=arg.train_path, num_epochs=1, batch_size=1)
+  for data_batch in train_dataset.take(arg.calibration_samples):
+    yield [tf.reshape(data_batch['data'], (1, arg.feature_row, arg.feature_column, 1))]
+
 
 '''
+@ name     : evaluate
+@ function : accuracy of a tflite model on the test TFRecord, int8 inputs and outputs are
+             quantized and dequantized with the parameters of the model like on the edge
+'''
+def evaluate(tflite_model):
+  interpreter = tf.lite.Interpreter(model_content=tflite_model)
+  interpreter.allocate_tensors()
+  runner = interpreter.get_signature_runner()
+  input_name, input_detail = list(runner.get_input_details().items())[0]
+  # output_1 is the prediction of the final model
+  output_detail = runner.get_output_details()['output_1']
+  correct = 0
+  total = 0
+  for data_batch in reader.test_reader_tfrecord(data_path=arg.test_path, batch_size=1):
+    x = data_batch['data'].numpy().reshape((1, arg.feature_row, arg.feature_column, 1))
+    scale, zero_point = input_detail['quantization']
+    if scale:
+      info = np.iinfo(input_detail['dtype'])
+      x = np.clip(np.rint(x / scale + zero_point), info.min, info.max)
+    y = runner(**{input_name: x.astype(input_detail['dtype'])})['output_1'].astype(np.float32)
+    scale, zero_point = output_detail['quantization']
+    if scale:
+      y = (y - zero_point) * scale
+    correct = correct + int((y.reshape(-1)[0] > 0.5) == data_batch['label'].numpy()[0])
+    total = total + 1
+  return correct / total
+
+
 for m in ['final']:
   # Convert the model
   converter = tf.lite.TFLiteConverter.from_saved_model(f"{arg.tensorflow_model_path}/{m}")  # path to the SavedModel directory
@@ -47,4 +51,65 @@ for m in ['final']:
   # Save the model.
   with open(f'{arg.tflite_model_path}.tflite', 'wb') as f:
     f.write(tflite_model)
-  print(f"{arg.activity} tflite model converted !")
\ No newline at end of file
+  print(f"{arg.activity} tflite model converted !")
+
+  if arg.int8:
+    # full integer model, calibrated with the train features
+    converter = tf.lite.TFLiteConverter.from_saved_model(f"{arg.tensorflow_model_path}/{m}")
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_data_gen
+    # Ensure that if any ops can't be quantized, the converter throws an error
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+    tflite_model_int8 = converter.convert()
+    with open(f'{arg.tflite_model_path}_int8.tflite', 'wb') as f:
+      f.write(tflite_model_int8)
+    print(f"{arg.activity} int8 tflite model converted !")
+
+    float_accuracy = evaluate(tflite_model)
+    int8_accuracy = evaluate(tflite_model_int8)
+    print(f"float accuracy: {float_accuracy}, int8 accuracy: {int8_accuracy}")
+    if float_accuracy - int8_accuracy > arg.int8_tolerance:
+      print(f"warning: int8 accuracy drops more than {arg.int8_tolerance}, keep the float model on the edge")
+
+
+'''
+@ name     : FusedModel
+@ function : one model with a shared input and a named output per activity, e.g. spin, up, down.
+             the final models of the activities are called on the same merged feature,
+             so the edge runs one invoke per window instead of one interpreter per activity.
+'''
+class FusedModel(tf.Module):
+  def __init__(self, activities):
+    super(FusedModel, self).__init__()
+    self.activities = activities
+    # the loaded final models are kept, their signatures only live as long as the objects they come from
+    self.loaded = [tf.saved_model.load(f"{os.path.dirname(arg.tensorflow_model_path)}/{a}/final") for a in activities]
+    # serving signatures of the final models, the same functions the single conversion above uses
+    self.models = [loaded.signatures['serving_default'] for loaded in self.loaded]
+
+  @tf.function(input_signature=[tf.TensorSpec([1, arg.feature_row, arg.feature_column, 1], tf.float32, name='input')])
+  def __call__(self, input_tensor):
+    # output_1 is the prediction of a final model, the others are the outputs of its single models
+    outputs = {}
+    for a, model in zip(self.activities, self.models):
+      # signature functions take their input by name only
+      input_name = list(model.structured_input_signature[1].keys())[0]
+      outputs[a] = model(**{input_name: input_tensor})['output_1']
+    return outputs
+
+
+# the input is the merged feature (1, 60, 91, 1), mic 0:66, acc x, y, z 66:90 and laser 90:91, the layout of
+# model.COLUMNS on the edge. fused.tflite is copied to edge/models/<scene dir>/fused.tflite, see arg.model_scenes
+activities = [a for a in arg.fused_activities if os.path.isdir(f"{os.path.dirname(arg.tensorflow_model_path)}/{a}/final")]
+if len(activities) == len(arg.fused_activities):
+  fused_model = FusedModel(activities)
+  # saved with its signature, the dict keys become the output names of the tflite signature
+  fused_saved_path = f"{os.path.dirname(arg.tensorflow_model_path)}/fused"
+  tf.saved_model.save(fused_model, fused_saved_path, signatures=fused_model.__call__.get_concrete_function())
+  converter = tf.lite.TFLiteConverter.from_saved_model(fused_saved_path)
+  tflite_model = converter.convert()
+  with open(f'{arg.fused_model_path}.tflite', 'wb') as f:
+    f.write(tflite_model)
+  print(f"{', '.join(activities)} fused tflite model converted !")